@@ -0,0 +1,265 @@
+"""Benchmark the ``/extract`` endpoint of fake-zyte-api.
+
+Run with ``python benchmarks/extract.py``. It starts the ecommerce, jobs and
+articles websites of ``zyte-test-websites`` and a fake Zyte API server in the
+current process, and then, for every scenario (an output or a combination of
+outputs), sends ``--requests`` requests to ``/extract`` with ``--concurrency``
+requests in flight, reporting requests per second, latency percentiles, and
+the peak RSS of the process.
+
+Use ``--server-args`` to configure the fake Zyte API server with the options
+of ``python -m fake_zyte_api.main``, e.g. ``--server-args="--item-cache"``,
+``--api-url`` to benchmark an already running server instead, ``--scenario``
+to only run some scenarios, and ``--output`` to write the results as JSON, to
+compare them between versions.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import shlex
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+from aiohttp import web
+from zyte_test_websites.articles.app import make_app as make_articles_website
+from zyte_test_websites.ecommerce.app import make_app as make_ecommerce_website
+from zyte_test_websites.jobs.app import make_app as make_jobs_website
+
+from fake_zyte_api import __version__
+from fake_zyte_api.main import make_app_from_args, parse_args
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# name: (website, path, request fields)
+SCENARIOS: dict[str, tuple[str, str, tuple[str, ...]]] = {
+    "httpResponseBody": ("jobs", "/jobs/4", ("httpResponseBody",)),
+    "httpResponseHeaders": ("jobs", "/jobs/4", ("httpResponseHeaders",)),
+    "browserHtml": ("jobs", "/jobs/4", ("browserHtml",)),
+    "product": ("ecommerce", "/product/1000", ("product",)),
+    "productList": ("ecommerce", "/category/11", ("productList",)),
+    "productNavigation": ("ecommerce", "/category/11", ("productNavigation",)),
+    "jobPosting": ("jobs", "/job/1888448280485890", ("jobPosting",)),
+    "jobPostingNavigation": ("jobs", "/jobs/4", ("jobPostingNavigation",)),
+    "article": ("articles", "/article/119", ("article",)),
+    "articleNavigation": ("articles", "/articles/2", ("articleNavigation",)),
+    "httpResponseBody+httpResponseHeaders": (
+        "jobs",
+        "/jobs/4",
+        ("httpResponseBody", "httpResponseHeaders"),
+    ),
+    "httpResponseBody+product": (
+        "ecommerce",
+        "/product/1000",
+        ("httpResponseBody", "product"),
+    ),
+    "browserHtml+productList+productNavigation": (
+        "ecommerce",
+        "/category/11",
+        ("browserHtml", "productList", "productNavigation"),
+    ),
+    "article+articleNavigation": (
+        "articles",
+        "/articles/2",
+        ("article", "articleNavigation"),
+    ),
+}
+
+WEBSITES: dict[str, Callable[[], web.Application]] = {
+    "ecommerce": make_ecommerce_website,
+    "jobs": make_jobs_website,
+    "articles": make_articles_website,
+}
+
+
+def peak_rss_kib() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """Return the nearest-rank *percent* percentile of *sorted_values*."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, round(percent / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def start_server(app: web.Application, runners: list[web.AppRunner]) -> str:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    runners.append(runner)
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    assert runner.addresses
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}"
+
+
+async def send_requests(
+    session: aiohttp.ClientSession,
+    api_url: str,
+    request_data: dict[str, Any],
+    *,
+    count: int,
+    concurrency: int,
+) -> tuple[list[float], int]:
+    """Send *count* requests, *concurrency* at a time, and return their
+    latencies and the number of non-200 responses."""
+    latencies: list[float] = []
+    errors = 0
+    remaining = count
+
+    async def worker() -> None:
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            start = perf_counter()
+            async with session.post(api_url, json=request_data) as response:
+                await response.read()
+                errors += response.status != 200
+            latencies.append(perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+async def run_scenario(
+    session: aiohttp.ClientSession,
+    api_url: str,
+    request_data: dict[str, Any],
+    *,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+) -> dict[str, Any]:
+    if warmup:
+        await send_requests(
+            session, api_url, request_data, count=warmup, concurrency=concurrency
+        )
+    start = perf_counter()
+    latencies, errors = await send_requests(
+        session, api_url, request_data, count=requests, concurrency=concurrency
+    )
+    elapsed = perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000,
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": latencies[-1] * 1000,
+        },
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    server_args = parse_args(["0", *shlex.split(args.server_args)])
+    runners: list[web.AppRunner] = []
+    results = []
+    with ExitStack() as stack:
+        try:
+            website_urls = {
+                name: await start_server(make_website(), runners)
+                for name, make_website in WEBSITES.items()
+            }
+            api_url = args.api_url
+            if api_url is None:
+                app = make_app_from_args(server_args, stack)
+                api_url = f"{await start_server(app, runners)}/extract"
+            connector = aiohttp.TCPConnector(limit=args.concurrency)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                for name in args.scenario or SCENARIOS:
+                    website, path, fields = SCENARIOS[name]
+                    request_data: dict[str, Any] = {
+                        "url": f"{website_urls[website]}{path}",
+                        **dict.fromkeys(fields, True),
+                    }
+                    result = await run_scenario(
+                        session,
+                        api_url,
+                        request_data,
+                        requests=args.requests,
+                        concurrency=args.concurrency,
+                        warmup=args.warmup,
+                    )
+                    results.append({"scenario": name, **result})
+                    print(
+                        f"{name:<42} {result['requests_per_second']:>9.1f} req/s"
+                        f"  p50 {result['latency_ms']['p50']:>8.2f} ms"
+                        f"  p95 {result['latency_ms']['p95']:>8.2f} ms"
+                        f"  p99 {result['latency_ms']['p99']:>8.2f} ms"
+                        f"  errors {result['errors']}",
+                        flush=True,
+                    )
+        finally:
+            for runner in reversed(runners):
+                await runner.cleanup()
+    return {
+        "fake_zyte_api_version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "server_args": args.server_args,
+            "api_url": args.api_url,
+        },
+        "results": results,
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=50,
+        help="requests per scenario sent before measuring (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="scenario to run, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--server-args",
+        default="",
+        help="options for the in-process fake Zyte API server",
+    )
+    parser.add_argument(
+        "--api-url",
+        help="URL of the /extract endpoint of an already running server",
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    print(f"Peak RSS: {report['peak_rss_kib'] / 1024:.1f} MiB")
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(report, indent=2) + "\n", encoding="utf-8"
+        )
+
+
+if __name__ == "__main__":
+    main()
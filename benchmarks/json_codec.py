@@ -0,0 +1,86 @@
+"""Compare the JSON codecs supported by fake-zyte-api.
+
+Run with ``python benchmarks/json_codec.py``. It encodes and decodes a
+response with ``httpResponseBody`` and ``productList``, as returned by
+``/extract``, with every installed codec.
+
+Results with CPython 3.11 and orjson 3.8 on Linux x86-64, with the default
+256 KiB website response body::
+
+    codec    dumps (ms)  loads (ms)
+    orjson        0.148       0.239
+    json          0.898       0.361
+
+i.e. orjson encodes such responses about 6x faster and decodes them about
+1.5x faster than the standard library. With a 4 KiB body the speedups are
+about 7.5x and 1.75x.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from base64 import b64encode
+from importlib.util import find_spec
+from timeit import Timer
+from typing import Any
+
+from fake_zyte_api.codec import JSON_CODEC_NAMES, get_json_codec
+
+
+def make_response_data(body_size: int) -> dict[str, Any]:
+    url = "https://ecommerce.example/category/11"
+    products = [
+        {
+            "currencyRaw": "£",
+            "name": f"Product {i}",
+            "price": f"{i}.99",
+            "productId": str(i),
+            "url": f"https://ecommerce.example/product/{i}",
+        }
+        for i in range(20)
+    ]
+    return {
+        "url": url,
+        "statusCode": 200,
+        "httpResponseBody": b64encode(os.urandom(body_size)).decode(),
+        "productList": {
+            "url": url,
+            "categoryName": "Children's",
+            "products": products,
+            "pageNumber": 1,
+            "metadata": {"dateDownloaded": "2024-01-01T00:00:00Z"},
+        },
+    }
+
+
+def measure(func: Any, number: int) -> float:
+    """Return the best time per call, in milliseconds."""
+    return min(Timer(func).repeat(repeat=5, number=number)) / number * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--body-size",
+        type=int,
+        default=256 * 1024,
+        help="website response body size, in bytes (default: %(default)s)",
+    )
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    data = make_response_data(args.body_size)
+    print(f"{'codec':<8} {'dumps (ms)':>10}  {'loads (ms)':>10}")
+    for name in JSON_CODEC_NAMES:
+        if name != "json" and find_spec(name) is None:
+            continue
+        codec = get_json_codec(name)
+        encoded = codec.dumps(data)
+        dumps_ms = measure(lambda: codec.dumps(data), args.number)  # noqa: B023
+        loads_ms = measure(lambda: codec.loads(encoded), args.number)  # noqa: B023
+        print(f"{name:<8} {dumps_ms:>10.3f}  {loads_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
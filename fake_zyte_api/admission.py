@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import TYPE_CHECKING
+
+from yarl import URL
+
+from .api import RequestError
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+
+class _Limit:
+    def __init__(self, concurrency: int, queue_size: int) -> None:
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.pending = 0
+        # Created on first use, to bind it to the running event loop.
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def full(self) -> bool:
+        return self.pending >= self.concurrency + self.queue_size
+
+    @asynccontextmanager
+    async def hold(self) -> AsyncIterator[None]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                yield
+        finally:
+            self.pending -= 1
+
+
+def _over_global_limit() -> RequestError:
+    return RequestError(
+        503,
+        "/limits/over-global-limit",
+        "Global Concurrency Limit Exceeded",
+        "Too many concurrent requests, retry later.",
+    )
+
+
+def _over_domain_limit(host: str) -> RequestError:
+    return RequestError(
+        429,
+        "/limits/over-domain-limit",
+        "Domain Concurrency Limit Exceeded",
+        f"Too many concurrent requests for {host}, retry later.",
+    )
+
+
+class AdmissionControl:
+    """Limits the number of requests handled concurrently.
+
+    Up to *max_concurrency* requests are handled at a time, up to
+    *max_queue* more wait for their turn, and any other request is rejected
+    with a 503 error. *max_concurrency_per_host* and *max_queue_per_host* do
+    the same for the requests for each target host, rejecting requests with a
+    429 error. ``None`` means no limit.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int | None = None,
+        max_queue: int = 0,
+        max_concurrency_per_host: int | None = None,
+        max_queue_per_host: int = 0,
+    ) -> None:
+        self._limit = (
+            None if max_concurrency is None else _Limit(max_concurrency, max_queue)
+        )
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.max_queue_per_host = max_queue_per_host
+        self._host_limits: dict[str, _Limit] = {}
+
+    @asynccontextmanager
+    async def admit(self, url: str) -> AsyncIterator[None]:
+        """Wait until a request for *url* can be handled, or raise a
+        :class:`~.api.RequestError` if it cannot wait."""
+        host = ""
+        host_limit = None
+        if self.max_concurrency_per_host is not None:
+            host = URL(url).host or ""
+            host_limit = self._host_limits.get(host)
+            if host_limit is None:
+                host_limit = self._host_limits[host] = _Limit(
+                    self.max_concurrency_per_host, self.max_queue_per_host
+                )
+        try:
+            async with AsyncExitStack() as stack:
+                if host_limit is not None:
+                    if host_limit.full():
+                        raise _over_domain_limit(host)
+                    await stack.enter_async_context(host_limit.hold())
+                if self._limit is not None:
+                    if self._limit.full():
+                        raise _over_global_limit()
+                    await stack.enter_async_context(self._limit.hold())
+                yield
+        finally:
+            if (
+                host_limit is not None
+                and not host_limit.pending
+                and self._host_limits.get(host) is host_limit
+            ):
+                del self._host_limits[host]
@@ -1,65 +1,641 @@
 from __future__ import annotations
 
+import asyncio
 from base64 import b64encode
-from typing import Any
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import cache, partial
+from hashlib import blake2b
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, TypeVar
 
 import aiohttp
-from itemadapter import ItemAdapter
-from web_poet import HttpResponse
-from zyte_common_items import ZyteItemAdapter
-from zyte_test_websites.articles.extraction import (
-    TestArticleNavigationPage,
-    TestArticlePage,
-)
-from zyte_test_websites.ecommerce.extraction import (
-    TestProductListPage,
-    TestProductNavigationPage,
-    TestProductPage,
-)
-from zyte_test_websites.jobs.extraction import (
-    TestJobPostingNavigationPage,
-    TestJobPostingPage,
-)
-
-ItemAdapter.ADAPTER_CLASSES.appendleft(ZyteItemAdapter)  # type: ignore[attr-defined]
-
-
-async def handle_request(request_data: dict[str, Any]) -> dict[str, Any]:
+
+from .cache import LRUCache, SharedCache
+from .codec import STDLIB_JSON_CODEC
+from .metrics import timed
+from .registry import make_default_registry
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Awaitable, Callable, Iterator, Mapping
+    from concurrent.futures import Executor
+
+    from itemadapter import ItemAdapter
+    from web_poet import HttpResponse, WebPage
+
+    from .coalesce import SingleFlight
+    from .codec import JSONCodec
+    from .metrics import Metrics
+    from .registry import PageRegistry
+    from .store import ResponseStore
+
+T = TypeVar("T")
+
+
+@cache
+def _item_adapter() -> type[ItemAdapter]:
+    from itemadapter import ItemAdapter
+    from zyte_common_items import ZyteItemAdapter
+
+    ItemAdapter.ADAPTER_CLASSES.appendleft(ZyteItemAdapter)  # type: ignore[attr-defined]
+    return ItemAdapter
+
+
+_DEFAULT_REGISTRY = make_default_registry()
+
+
+class RequestError(Exception):
+    """Error reported to the client as a Zyte API error response."""
+
+    def __init__(self, status: int, type: str, title: str, detail: str) -> None:
+        super().__init__(detail)
+        self.status = status
+        self.type = type
+        self.title = title
+        self.detail = detail
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "type": self.type,
+            "title": self.title,
+            "status": self.status,
+            "detail": self.detail,
+        }
+
+
+@dataclass(frozen=True)
+class WebsiteResponse:
+    status: int
+    headers: tuple[tuple[str, str], ...]
+    body: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+
+ResponseCache = LRUCache[str, WebsiteResponse]
+
+
+def make_response_cache(
+    *, max_size: int = 64 * 1024 * 1024, ttl: float | None = None
+) -> ResponseCache:
+    """Return a cache of website responses bound to *max_size* bytes."""
+    return ResponseCache(max_size=max_size, ttl=ttl, sizeof=lambda r: r.size)
+
+
+ItemCache = LRUCache[tuple[type["WebPage[Any]"], str, bytes], dict[str, Any]]
+
+
+def make_item_cache(*, max_size: int = 1024) -> ItemCache:
+    """Return a cache of up to *max_size* extracted items.
+
+    Items are keyed by page object class, URL and a digest of the response
+    body.
+    """
+    return ItemCache(max_size=max_size)
+
+
+def _dump_response(website_response: WebsiteResponse) -> bytes:
+    head = STDLIB_JSON_CODEC.dumps([website_response.status, website_response.headers])
+    return len(head).to_bytes(4, "big") + head + website_response.body
+
+
+def _load_response(data: bytes) -> WebsiteResponse:
+    head_size = int.from_bytes(data[:4], "big")
+    status, headers = STDLIB_JSON_CODEC.loads(data[4 : 4 + head_size])
+    return WebsiteResponse(
+        status=status,
+        headers=tuple((name, value) for name, value in headers),
+        body=data[4 + head_size :],
+    )
+
+
+def _item_key(page: type[WebPage[Any]], url: str, body_digest: bytes) -> str:
+    return f"item {page.__module__}.{page.__qualname__} {body_digest.hex()} {url}"
+
+
+async def _get_cached_item(
+    page: type[WebPage[Any]],
+    url: str,
+    body_digest: bytes,
+    item_cache: ItemCache | None,
+    shared_cache: SharedCache | None,
+) -> dict[str, Any] | None:
+    if item_cache is not None:
+        item = item_cache.get((page, url, body_digest))
+        if item is not None:
+            return item
+    if shared_cache is not None:
+        data = await shared_cache.get(_item_key(page, url, body_digest))
+        if data is not None:
+            shared_item: dict[str, Any] = STDLIB_JSON_CODEC.loads(data)
+            if item_cache is not None:
+                item_cache.set((page, url, body_digest), shared_item)
+            return shared_item
+    return None
+
+
+async def _cache_item(
+    page: type[WebPage[Any]],
+    url: str,
+    body_digest: bytes,
+    item: dict[str, Any],
+    item_cache: ItemCache | None,
+    shared_cache: SharedCache | None,
+) -> None:
+    if item_cache is not None:
+        item_cache.set((page, url, body_digest), item)
+    if shared_cache is not None:
+        await shared_cache.set(
+            _item_key(page, url, body_digest), STDLIB_JSON_CODEC.dumps(item)
+        )
+
+
+def _utcnow_formatted() -> str:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return f"{now.isoformat(timespec='seconds')}Z"
+
+
+def _restamp(item: dict[str, Any]) -> dict[str, Any]:
+    """Return a copy of a cached *item* with a fresh download date."""
+    metadata = item.get("metadata")
+    if not metadata or "dateDownloaded" not in metadata:
+        return item
+    return {**item, "metadata": {**metadata, "dateDownloaded": _utcnow_formatted()}}
+
+
+def _body_too_large(url: str, max_body_size: int) -> RequestError:
+    return RequestError(
+        521,
+        "/download/internal-error",
+        "Internal Downloading Error",
+        f"The response body of {url} exceeds {max_body_size} bytes.",
+    )
+
+
+async def _read_body(
+    resp: aiohttp.ClientResponse, url: str, max_body_size: int | None
+) -> bytes:
+    if max_body_size is None:
+        return await resp.read()
+    if resp.content_length is not None and resp.content_length > max_body_size:
+        raise _body_too_large(url, max_body_size)
+    chunks = []
+    size = 0
+    async for chunk in resp.content.iter_any():
+        size += len(chunk)
+        if size > max_body_size:
+            raise _body_too_large(url, max_body_size)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+# Errors that may not happen again if the request is sent again.
+_RETRYABLE_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+def _download_error(url: str, exception: Exception) -> RequestError:
+    if isinstance(exception, aiohttp.InvalidURL):
+        return RequestError(
+            400, "/request/invalid", "Invalid Request", f"Invalid URL: {url}"
+        )
+    if isinstance(exception, _RETRYABLE_ERRORS):
+        return RequestError(
+            520,
+            "/download/temporary-error",
+            "Temporary Downloading Error",
+            f"Could not fetch {url}: {exception!r}",
+        )
+    return RequestError(
+        521,
+        "/download/internal-error",
+        "Internal Downloading Error",
+        f"Could not fetch {url}: {exception!r}",
+    )
+
+
+async def _with_retries(
+    func: Callable[[], Awaitable[T]], url: str, *, retries: int, retry_backoff: float
+) -> T:
+    """Return the result of *func*, calling it again up to *retries* times
+    if it raises a connection error or times out, waiting *retry_backoff*
+    seconds before the first retry and twice as long before each of the next
+    ones.
+
+    aiohttp errors are reported as a :class:`RequestError`.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except _RETRYABLE_ERRORS as exception:
+            if attempt >= retries:
+                raise _download_error(url, exception) from exception
+        except aiohttp.ClientError as exception:
+            raise _download_error(url, exception) from exception
+        await asyncio.sleep(retry_backoff * 2**attempt)
+        attempt += 1
+
+
+async def _fetch_once(
+    url: str, session: aiohttp.ClientSession, max_body_size: int | None
+) -> WebsiteResponse:
+    async with session.get(url) as resp:
+        body = await _read_body(resp, url, max_body_size)
+        return WebsiteResponse(
+            status=resp.status,
+            headers=tuple(resp.headers.items()),
+            body=body,
+        )
+
+
+async def _fetch(
+    url: str,
+    *,
+    session: aiohttp.ClientSession | None,
+    max_body_size: int | None = None,
+    retries: int = 0,
+    retry_backoff: float = 0.5,
+) -> WebsiteResponse:
+    if session is None:
+        async with aiohttp.ClientSession() as new_session:
+            return await _fetch(
+                url,
+                session=new_session,
+                max_body_size=max_body_size,
+                retries=retries,
+                retry_backoff=retry_backoff,
+            )
+    return await _with_retries(
+        partial(_fetch_once, url, session, max_body_size),
+        url,
+        retries=retries,
+        retry_backoff=retry_backoff,
+    )
+
+
+async def _get_website_response(
+    url: str,
+    *,
+    session: aiohttp.ClientSession | None,
+    response_cache: ResponseCache | None,
+    shared_cache: SharedCache | None,
+    single_flight: SingleFlight | None,
+    response_store: ResponseStore | None,
+    max_body_size: int | None,
+    metrics: Metrics | None,
+    retries: int,
+    retry_backoff: float,
+) -> WebsiteResponse:
+    if response_store is not None and response_store.replay:
+        website_response = response_store.get(url)
+        if website_response is None:
+            raise RequestError(
+                521,
+                "/download/internal-error",
+                "Internal Downloading Error",
+                f"No response for {url} in {response_store.path}.",
+            )
+        return website_response
+
+    if response_cache is not None:
+        website_response = response_cache.get(url)
+        if website_response is not None:
+            return website_response
+
+    if shared_cache is not None:
+        data = await shared_cache.get(f"response {url}")
+        if data is not None:
+            website_response = _load_response(data)
+            if response_cache is not None:
+                response_cache.set(url, website_response)
+            return website_response
+
+    async def fetch() -> WebsiteResponse:
+        do_fetch = partial(
+            _fetch,
+            url,
+            session=session,
+            max_body_size=max_body_size,
+            retries=retries,
+            retry_backoff=retry_backoff,
+        )
+        if metrics is None:
+            website_response = await do_fetch()
+        else:
+            with metrics.upstream_request():
+                website_response = await do_fetch()
+            metrics.upstream_responses[website_response.status] += 1
+        if response_store is not None:
+            response_store.put(url, website_response)
+        # Server errors are likely transient, do not make them stick.
+        if website_response.status < 500:
+            if response_cache is not None:
+                response_cache.set(url, website_response)
+            if shared_cache is not None:
+                await shared_cache.set(
+                    f"response {url}", _dump_response(website_response)
+                )
+        return website_response
+
+    if single_flight is None:
+        return await fetch()
+    return await single_flight.run(("fetch", url), fetch)
+
+
+async def _extract_item(
+    page: type[WebPage[Any]], web_poet_response: HttpResponse, *, share_selector: bool
+) -> dict[str, Any]:
+    from web_poet import WebPage
+
+    page_instance = page(web_poet_response)
+    if share_selector and page._selector_input is WebPage._selector_input:
+        # web-poet caches a selector per page object, even for page objects
+        # that wrap the same response, so each of them would parse the
+        # response body again.
+        page_instance._SelectableMixin__cached_selector = web_poet_response.selector  # type: ignore[attr-defined]
+    item = await page_instance.to_item()
+    return _item_adapter()(item).asdict()
+
+
+def _make_web_poet_response(
+    url: str, website_response: WebsiteResponse
+) -> HttpResponse:
+    """Return a web-poet response for *website_response*, to share between
+    ``browserHtml`` and item extraction, so that the encoding of the body is
+    detected and the body is decoded only once."""
+    from web_poet import HttpResponse
+
+    return HttpResponse(
+        url,
+        website_response.body,
+        status=website_response.status,
+        headers=website_response.headers,
+    )
+
+
+def _extract_items_sync(
+    pages: tuple[type[WebPage[Any]], ...], url: str, website_response: WebsiteResponse
+) -> list[dict[str, Any]]:
+    """Extract the items of *pages* from a response in a new event loop, to
+    run in a thread or process pool."""
+
+    async def extract_all() -> list[dict[str, Any]]:
+        web_poet_response = _make_web_poet_response(url, website_response)
+        share_selector = len(pages) > 1
+        return await asyncio.gather(
+            *(
+                _extract_item(page, web_poet_response, share_selector=share_selector)
+                for page in pages
+            )
+        )
+
+    return asyncio.run(extract_all())
+
+
+async def _run_pages(
+    pages: tuple[type[WebPage[Any]], ...],
+    url: str,
+    website_response: WebsiteResponse,
+    *,
+    web_poet_response: HttpResponse | None,
+    single_flight: SingleFlight | None,
+    executor: Executor | None,
+) -> list[dict[str, Any]]:
+    body = website_response.body
+    if executor is not None:
+        loop = asyncio.get_running_loop()
+        func = partial(
+            loop.run_in_executor,
+            executor,
+            _extract_items_sync,
+            pages,
+            url,
+            website_response,
+        )
+        if single_flight is None:
+            return await func()
+        return await single_flight.run((pages, url, body), func)
+
+    response = web_poet_response or _make_web_poet_response(url, website_response)
+    share_selector = len(pages) > 1
+
+    async def extract(page: type[WebPage[Any]]) -> dict[str, Any]:
+        func = partial(_extract_item, page, response, share_selector=share_selector)
+        if single_flight is None:
+            return await func()
+        return await single_flight.run((page, url, body), func)
+
+    return await asyncio.gather(*(extract(page) for page in pages))
+
+
+async def _extract_items(
+    pages: Mapping[str, type[WebPage[Any]]],
+    url: str,
+    website_response: WebsiteResponse,
+    *,
+    web_poet_response: HttpResponse | None,
+    item_cache: ItemCache | None,
+    shared_cache: SharedCache | None,
+    single_flight: SingleFlight | None,
+    executor: Executor | None,
+) -> dict[str, dict[str, Any]]:
+    items = {}
+    body_digest = b""
+    if item_cache is not None or shared_cache is not None:
+        body_digest = blake2b(website_response.body, digest_size=16).digest()
+        for key, page in pages.items():
+            cached_item = await _get_cached_item(
+                page, url, body_digest, item_cache, shared_cache
+            )
+            if cached_item is not None:
+                items[key] = _restamp(cached_item)
+
+    pending = {key: page for key, page in pages.items() if key not in items}
+    if pending:
+        results = await _run_pages(
+            tuple(pending.values()),
+            url,
+            website_response,
+            web_poet_response=web_poet_response,
+            single_flight=single_flight,
+            executor=executor,
+        )
+        for (key, page), item in zip(pending.items(), results):
+            await _cache_item(page, url, body_digest, item, item_cache, shared_cache)
+            items[key] = item
+
+    return {key: items[key] for key in pages}
+
+
+async def handle_request(
+    request_data: dict[str, Any],
+    *,
+    session: aiohttp.ClientSession | None = None,
+    response_cache: ResponseCache | None = None,
+    single_flight: SingleFlight | None = None,
+    item_cache: ItemCache | None = None,
+    executor: Executor | None = None,
+    response_store: ResponseStore | None = None,
+    max_body_size: int | None = None,
+    metrics: Metrics | None = None,
+    retries: int = 0,
+    retry_backoff: float = 0.5,
+    page_registry: PageRegistry | None = None,
+    shared_cache: SharedCache | None = None,
+) -> dict[str, Any]:
     url = request_data["url"]
     response_data: dict[str, Any] = {
         "url": url,
     }
 
-    async with aiohttp.ClientSession() as session, session.get(url) as resp:
-        response_data["statusCode"] = resp.status
-        website_response_body = await resp.read()
+    website_response = await _get_website_response(
+        url,
+        session=session,
+        response_cache=response_cache,
+        shared_cache=shared_cache,
+        single_flight=single_flight,
+        response_store=response_store,
+        max_body_size=max_body_size,
+        metrics=metrics,
+        retries=retries,
+        retry_backoff=retry_backoff,
+    )
+    response_data["statusCode"] = website_response.status
 
     if "httpResponseHeaders" in request_data:
-        headers = [{"name": k, "value": v} for k, v in resp.headers.items()]
+        headers = [{"name": k, "value": v} for k, v in website_response.headers]
         response_data["httpResponseHeaders"] = headers
 
     if "httpResponseBody" in request_data:
-        body_b64 = b64encode(website_response_body).decode()
+        with timed(metrics, "base64"):
+            body_b64 = b64encode(website_response.body).decode()
         response_data["httpResponseBody"] = body_b64
 
+    web_poet_response = None
     if "browserHtml" in request_data:
-        response_data["browserHtml"] = website_response_body.decode(resp.get_encoding())
-
-    pages = {
-        "product": TestProductPage,
-        "productList": TestProductListPage,
-        "productNavigation": TestProductNavigationPage,
-        "jobPosting": TestJobPostingPage,
-        "jobPostingNavigation": TestJobPostingNavigationPage,
-        "article": TestArticlePage,
-        "articleNavigation": TestArticleNavigationPage,
-    }
+        web_poet_response = _make_web_poet_response(url, website_response)
+        with timed(metrics, "decode"):
+            response_data["browserHtml"] = web_poet_response.text
 
-    for key, page in pages.items():
-        if key in request_data:
-            web_poet_response = HttpResponse(url, website_response_body)
-            page_instance = page(web_poet_response)
-            item = await page_instance.to_item()
-            response_data[key] = ItemAdapter(item).asdict()
+    requested_pages = (page_registry or _DEFAULT_REGISTRY).get_pages(request_data, url)
+    if requested_pages:
+        if metrics is not None:
+            metrics.items.update(requested_pages.keys())
+        with timed(metrics, "extraction"):
+            items = await _extract_items(
+                requested_pages,
+                url,
+                website_response,
+                web_poet_response=web_poet_response,
+                item_cache=item_cache,
+                shared_cache=shared_cache,
+                single_flight=single_flight,
+                executor=executor,
+            )
+        response_data.update(items)
 
     return response_data
+
+
+_STREAMABLE_FIELDS = frozenset({"url", "httpResponseBody", "httpResponseHeaders"})
+
+
+def can_stream(request_data: dict[str, Any]) -> bool:
+    """Return ``True`` if the response to *request_data* can be built with
+    :func:`stream_request`, i.e. if it does not need the whole website response
+    body in memory."""
+    return (
+        "httpResponseBody" in request_data and request_data.keys() <= _STREAMABLE_FIELDS
+    )
+
+
+class _Base64Encoder:
+    """Base64-encodes data received in chunks of any size."""
+
+    def __init__(self) -> None:
+        self._pending = b""
+
+    def encode(self, chunk: bytes) -> Iterator[bytes]:
+        view = memoryview(chunk)
+        if self._pending:
+            missing = 3 - len(self._pending)
+            self._pending += view[:missing].tobytes()
+            view = view[missing:]
+            if len(self._pending) < 3:
+                return
+            yield b64encode(self._pending)
+            self._pending = b""
+        end = len(view) - len(view) % 3
+        if end:
+            yield b64encode(view[:end])
+        self._pending = view[end:].tobytes()
+
+    def flush(self) -> bytes:
+        return b64encode(self._pending)
+
+
+async def stream_request(
+    request_data: dict[str, Any],
+    *,
+    session: aiohttp.ClientSession,
+    max_body_size: int | None = None,
+    json_codec: JSONCodec = STDLIB_JSON_CODEC,
+    metrics: Metrics | None = None,
+    retries: int = 0,
+    retry_backoff: float = 0.5,
+) -> AsyncIterator[bytes]:
+    """Yield the JSON response to *request_data* in chunks, base64-encoding
+    the website response body as it is received.
+
+    *request_data* must pass :func:`can_stream`.
+    """
+    url = request_data["url"]
+    upstream_request = nullcontext() if metrics is None else metrics.upstream_request()
+    with upstream_request:
+        # Once the response starts being streamed it can no longer be retried.
+        resp = await _with_retries(
+            partial(session.get, url), url, retries=retries, retry_backoff=retry_backoff
+        )
+        async with resp:
+            if metrics is not None:
+                metrics.upstream_responses[resp.status] += 1
+            if (
+                max_body_size is not None
+                and resp.content_length is not None
+                and resp.content_length > max_body_size
+            ):
+                raise _body_too_large(url, max_body_size)
+            response_data: dict[str, Any] = {
+                "url": url,
+                "statusCode": resp.status,
+            }
+            if "httpResponseHeaders" in request_data:
+                headers = [{"name": k, "value": v} for k, v in resp.headers.items()]
+                response_data["httpResponseHeaders"] = headers
+            # Leave the JSON object open to append httpResponseBody.
+            yield json_codec.dumps(response_data)[:-1] + b', "httpResponseBody": "'
+            encoder = _Base64Encoder()
+            size = 0
+            # Observed once per response, like for responses that are not
+            # streamed.
+            base64_seconds = 0.0
+            try:
+                async for chunk in resp.content.iter_any():
+                    size += len(chunk)
+                    if max_body_size is not None and size > max_body_size:
+                        raise _body_too_large(url, max_body_size)
+                    start = perf_counter()
+                    encoded_chunks = list(encoder.encode(chunk))
+                    base64_seconds += perf_counter() - start
+                    for encoded_chunk in encoded_chunks:
+                        yield encoded_chunk
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+                raise _download_error(url, exception) from exception
+            start = perf_counter()
+            last_chunk = encoder.flush() + b'"}'
+            if metrics is not None:
+                metrics.observe("base64", base64_seconds + perf_counter() - start)
+            yield last_chunk
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import monotonic, time
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable
+
+K = TypeVar("K", bound="Hashable")
+V = TypeVar("V")
+T = TypeVar("T")
+
+
+class LRUCache(Generic[K, V]):
+    """In-process cache with LRU eviction and an optional TTL.
+
+    *max_size* bounds the sum of the sizes of the stored values, as returned
+    by *sizeof* (1 per value by default, i.e. a bound on the number of
+    entries). Values bigger than *max_size* are not stored.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int,
+        ttl: float | None = None,
+        sizeof: Callable[[V], int] = lambda value: 1,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._entries: OrderedDict[K, tuple[float, int, V]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, _, value = entry
+            if expires_at >= monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def set(self, key: K, value: V) -> None:
+        size = self._sizeof(value)
+        if size > self.max_size:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = float("inf") if self.ttl is None else monotonic() + self.ttl
+        self._entries[key] = (expires_at, size, value)
+        self.size += size
+        while self.size > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key: K) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+
+# How long to wait for the database lock of a shared cache held by another
+# process, in milliseconds.
+_BUSY_TIMEOUT_MS = 100
+
+
+def _transaction(connection: sqlite3.Connection) -> sqlite3.Connection:
+    # Take the write lock right away, instead of when first writing,
+    # which could fail with a deadlock error.
+    connection.execute("BEGIN IMMEDIATE")
+    return connection
+
+
+def default_shared_cache_path(name: str) -> Path:
+    """Return the path of the shared cache called *name*, in memory-backed
+    ``/dev/shm`` if available."""
+    directory = Path("/dev/shm")  # noqa: S108
+    if not directory.is_dir():
+        directory = Path(tempfile.gettempdir())
+    return directory / f"fake-zyte-api-{name}.sqlite3"
+
+
+def remove_shared_cache(path: str | os.PathLike[str]) -> None:
+    """Remove the shared cache at *path*, if it exists."""
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{os.fspath(path)}{suffix}").unlink(missing_ok=True)
+
+
+class SharedCache:
+    """Cache of bytes by string key, shared by the processes of a host.
+
+    Entries are stored in a SQLite database at *path*, which should be in a
+    memory-backed file system like ``/dev/shm``, see
+    :func:`default_shared_cache_path`, and which is created if missing. SQLite
+    handles locking between processes, and its write-ahead log lets them read
+    while another one writes.
+
+    *max_size* bounds the sum of the sizes of the stored values, in bytes,
+    evicting the oldest entries first. Values bigger than *max_size* are not
+    stored. Entries expire *ttl* seconds after being stored, if set.
+
+    Database calls run in a thread of the cache, off the event loop. Database
+    errors, like another process holding the write lock for too long, make
+    :meth:`get` miss, :meth:`set` and :meth:`clear` do nothing and
+    :meth:`count` return 0 instead of being raised.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        max_size: int = 256 * 1024 * 1024,
+        ttl: float | None = None,
+    ) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._count = 0
+        # A single thread, so that the connection is only used from the
+        # thread that created it.
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="shared-cache")
+        self._connection = self._executor.submit(self._connect).result()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.execute(f"PRAGMA mmap_size = {int(self.max_size) * 2}")
+        # Several processes may create the cache at the same time.
+        with _transaction(connection):
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT NOT NULL UNIQUE,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS size (total INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "INSERT INTO size SELECT 0 WHERE NOT EXISTS (SELECT * FROM size)"
+            )
+        # Once created, rather skip the cache than wait for it.
+        connection.execute(f"PRAGMA busy_timeout = {_BUSY_TIMEOUT_MS}")
+        return connection
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def __len__(self) -> int:
+        """Return the number of entries found by the last :meth:`count`
+        call, without blocking."""
+        return self._count
+
+    async def count(self) -> int:
+        """Count the entries, of all processes."""
+        self._count = await self._run(self._count_entries)
+        return self._count
+
+    def _count_entries(self) -> int:
+        try:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM entries"
+            ).fetchone()
+        except sqlite3.Error:
+            return 0
+        return count  # type: ignore[no-any-return]
+
+    async def get(self, key: str) -> bytes | None:
+        value = await self._run(self._get, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _get(self, key: str) -> bytes | None:
+        try:
+            row = self._connection.execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at >= ?",
+                (key, time()),
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return None if row is None else row[0]
+
+    async def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_size:
+            return
+        await self._run(self._set, key, value)
+
+    def _set(self, key: str, value: bytes) -> None:
+        size = len(value)
+        expires_at = sys.float_info.max if self.ttl is None else time() + self.ttl
+        try:
+            with _transaction(self._connection) as connection:
+                row = connection.execute(
+                    "SELECT length(value) FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                # Replacing the entry gives it a new id, i.e. makes it the newest.
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                connection.execute(
+                    "INSERT INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                connection.execute(
+                    "UPDATE size SET total = total + ?",
+                    (size - (row[0] if row else 0),),
+                )
+                (total,) = connection.execute("SELECT total FROM size").fetchone()
+                if total > self.max_size:
+                    self._evict(connection, total - self.max_size)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, connection: sqlite3.Connection, excess: int) -> None:
+        freed = 0
+        last_id = None
+        for entry_id, size in connection.execute(
+            "SELECT id, length(value) FROM entries ORDER BY id"
+        ):
+            freed += size
+            last_id = entry_id
+            if freed >= excess:
+                break
+        connection.execute("DELETE FROM entries WHERE id <= ?", (last_id,))
+        connection.execute("UPDATE size SET total = total - ?", (freed,))
+
+    async def clear(self) -> None:
+        await self._run(self._clear)
+
+    def _clear(self) -> None:
+        try:
+            with _transaction(self._connection) as connection:
+                connection.execute("DELETE FROM entries")
+                connection.execute("UPDATE size SET total = 0")
+        except sqlite3.Error:
+            pass
+
+    def close(self) -> None:
+        self._executor.submit(self._connection.close).result()
+        self._executor.shutdown()
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+from copy import deepcopy
+from typing import TYPE_CHECKING, Any
+
+from .main import handle_app_request, make_app
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Iterator
+
+    from aiohttp import web
+
+
+class InProcessZyteAPI:
+    """Zyte API client that handles requests with a fake Zyte API application
+    in the current process, without HTTP.
+
+    It has the :meth:`get` and :meth:`iter` methods of
+    ``zyte_api.AsyncZyteAPI``, so it can replace it in tests, but errors are
+    raised as :class:`~.api.RequestError` instead of
+    ``zyte_api.RequestError``.
+
+    *app* is an application returned by :func:`~.main.make_app`, by default
+    one with the default options. Call :meth:`start` before sending requests
+    and :meth:`close` when done.
+    """
+
+    def __init__(self, app: web.Application | None = None) -> None:
+        self.app = make_app() if app is None else app
+
+    async def start(self) -> None:
+        # Same order as aiohttp.web.AppRunner, which lets startup handlers
+        # still store objects in the application.
+        self.app.on_startup.freeze()
+        await self.app.startup()
+        self.app.freeze()
+
+    async def close(self) -> None:
+        await self.app.shutdown()
+        await self.app.cleanup()
+
+    async def get(
+        self, query: dict[str, Any], *, endpoint: str = "extract", **kwargs: Any
+    ) -> dict[str, Any]:
+        """Return the response to *query*.
+
+        Other keyword arguments of ``zyte_api.AsyncZyteAPI.get``, like
+        ``handle_retries``, are accepted and ignored.
+        """
+        if endpoint != "extract":
+            raise ValueError(f"Unsupported endpoint: {endpoint!r}")
+        response_data = await handle_app_request(self.app, query)
+        # Items may be shared with concurrent requests for the same URL and
+        # with the item cache, do not let callers modify them.
+        return deepcopy(response_data)
+
+    def iter(
+        self, queries: list[dict[str, Any]], *, endpoint: str = "extract", **kwargs: Any
+    ) -> Iterator[Awaitable[dict[str, Any]]]:
+        """Send *queries* concurrently, and return an iterator of awaitables
+        for their responses, in completion order."""
+        return asyncio.as_completed(
+            [self.get(query, endpoint=endpoint) for query in queries]
+        )
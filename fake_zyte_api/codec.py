@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+JSON_CODEC_NAMES = ("orjson", "ujson", "json")
+
+
+@dataclass(frozen=True)
+class JSONCodec:
+    """JSON decoding and encoding functions, working on bytes."""
+
+    name: str
+    loads: Callable[[bytes], Any]
+    dumps: Callable[[Any], bytes]
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj).encode()
+
+
+STDLIB_JSON_CODEC = JSONCodec("json", json.loads, _stdlib_dumps)
+
+
+def _load_json_codec(name: str) -> JSONCodec:
+    if name == "orjson":
+        import orjson
+
+        return JSONCodec("orjson", orjson.loads, orjson.dumps)
+    if name == "ujson":
+        import ujson
+
+        def ujson_dumps(obj: Any) -> bytes:
+            return ujson.dumps(  # type: ignore[no-any-return]
+                obj, ensure_ascii=False, escape_forward_slashes=False
+            ).encode()
+
+        return JSONCodec("ujson", ujson.loads, ujson_dumps)
+    if name == "json":
+        return STDLIB_JSON_CODEC
+    raise ValueError(f"Unknown JSON codec: {name!r}")
+
+
+def get_json_codec(name: str | None = None) -> JSONCodec:
+    """Return the JSON codec called *name* or, if *name* is ``None``, the
+    fastest installed codec, trying orjson and ujson before falling back to
+    the standard library."""
+    if name is not None:
+        return _load_json_codec(name)
+    for candidate in ("orjson", "ujson"):
+        if find_spec(candidate) is not None:
+            return _load_json_codec(candidate)
+    return STDLIB_JSON_CODEC
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import sys
+import zlib
+from importlib.util import find_spec
+from typing import TYPE_CHECKING, Any, Protocol
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+
+# Supported content codings, from most to least preferred.
+CONTENT_CODING_NAMES = ("zstd", "br", "gzip")
+
+# Default compression levels, favoring speed over ratio.
+DEFAULT_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def sync_flush(self) -> bytes:
+        """Return the rest of the data compressed so far, so that it can be
+        decompressed before the end of the stream."""
+        ...
+
+    def flush(self) -> bytes:
+        """Return the rest of the data compressed so far, and end the
+        stream."""
+        ...
+
+
+class _GzipCompressor:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def sync_flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, level: int) -> None:
+        try:
+            import brotlicffi as brotli
+        except ImportError:
+            import brotli
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)  # type: ignore[no-any-return]
+
+    def sync_flush(self) -> bytes:
+        return self._compressor.flush()  # type: ignore[no-any-return]
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()  # type: ignore[no-any-return]
+
+
+class _ZstdCompressor:
+    def __init__(self, level: int) -> None:
+        # The same implementation aiohttp uses to decompress request bodies.
+        if sys.version_info >= (3, 14):
+            from compression.zstd import ZstdCompressor
+        else:
+            from backports.zstd import ZstdCompressor
+        self._compressor: Any = ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)  # type: ignore[no-any-return]
+
+    def sync_flush(self) -> bytes:
+        return self._compressor.flush(  # type: ignore[no-any-return]
+            self._compressor.FLUSH_BLOCK
+        )
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()  # type: ignore[no-any-return]
+
+
+def _is_installed(name: str) -> bool:
+    try:
+        return find_spec(name) is not None
+    except ModuleNotFoundError:  # Missing parent package.
+        return False
+
+
+def is_available(coding: str) -> bool:
+    """Return whether the libraries needed for the *coding* content coding
+    are installed."""
+    if coding == "gzip":
+        return True
+    if coding == "br":
+        return _is_installed("brotli") or _is_installed("brotlicffi")
+    if coding == "zstd":
+        return _is_installed(
+            "compression.zstd" if sys.version_info >= (3, 14) else "backports.zstd"
+        )
+    raise ValueError(f"Unknown content coding: {coding!r}")
+
+
+def _parse_accept_encoding(header: str) -> dict[str, float]:
+    weights = {}
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights
+
+
+class Compression:
+    """Response compression, negotiated through ``Accept-Encoding``.
+
+    *codings* are the content codings to use, among ``zstd``, ``br`` and
+    ``gzip``, from most to least preferred when a client accepts several
+    with the same weight. They default to those installed, see
+    :func:`is_available`; ``br`` needs ``brotli`` and ``zstd`` needs
+    ``backports.zstd`` before Python 3.14.
+
+    Responses smaller than *min_size* bytes are not compressed, unless they
+    are streamed, because their size is not known in advance.
+
+    *levels* maps content codings to compression levels, by default those of
+    :data:`DEFAULT_LEVELS`.
+    """
+
+    def __init__(
+        self,
+        *,
+        codings: Sequence[str] | None = None,
+        min_size: int = 1024,
+        levels: Mapping[str, int] | None = None,
+    ) -> None:
+        if codings is None:
+            codings = [name for name in CONTENT_CODING_NAMES if is_available(name)]
+        for coding in codings:
+            if not is_available(coding):
+                raise ValueError(f"The {coding!r} content coding is not installed.")
+        for coding in levels or {}:
+            if coding not in CONTENT_CODING_NAMES:
+                raise ValueError(f"Unknown content coding: {coding!r}")
+        self.codings = tuple(codings)
+        self.min_size = min_size
+        self.levels = {**DEFAULT_LEVELS, **(levels or {})}
+
+    def negotiate(self, accept_encoding: str) -> str | None:
+        """Return the content coding to use for a request with the
+        *accept_encoding* ``Accept-Encoding`` header, or ``None`` to send the
+        response uncompressed."""
+        weights = _parse_accept_encoding(accept_encoding)
+        best_coding, best_weight = None, 0.0
+        for coding in self.codings:
+            weight = weights.get(coding, weights.get("*", 0.0))
+            if weight > best_weight:
+                best_coding, best_weight = coding, weight
+        return best_coding
+
+    def compressor(self, coding: str) -> Compressor:
+        """Return an object that compresses data chunk by chunk with
+        *coding*."""
+        level = self.levels[coding]
+        if coding == "gzip":
+            return _GzipCompressor(level)
+        if coding == "br":
+            return _BrotliCompressor(level)
+        if coding == "zstd":
+            return _ZstdCompressor(level)
+        raise ValueError(f"Unknown content coding: {coding!r}")
+
+    def compress(self, data: bytes, coding: str) -> bytes:
+        """Return *data* compressed with *coding*."""
+        compressor = self.compressor(coding)
+        return compressor.compress(data) + compressor.flush()
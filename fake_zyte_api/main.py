@@ -1,33 +1,1130 @@
 from __future__ import annotations
 
-import sys
+import argparse
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, asynccontextmanager
+from typing import TYPE_CHECKING, Any
 
+import aiohttp
 from aiohttp import web
 
-from .api import handle_request
+from .admission import AdmissionControl
+from .api import (
+    ItemCache,
+    RequestError,
+    ResponseCache,
+    can_stream,
+    handle_request,
+    make_item_cache,
+    make_response_cache,
+    stream_request,
+)
+from .cache import SharedCache, default_shared_cache_path, remove_shared_cache
+from .coalesce import SingleFlight
+from .codec import JSON_CODEC_NAMES, JSONCodec, get_json_codec
+from .compression import DEFAULT_LEVELS, Compression, Compressor
+from .metrics import Metrics, timed
+from .profiling import PROFILE_MODES, Profiler, ProfilerBusy
+from .registry import PageRegistry, make_default_registry
+from .simulation import Simulation
+from .store import ResponseStore
+from .websites import DEFAULT_WEBSITES, EmbeddedWebsites
+from .workers import run_workers
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+    from contextlib import AbstractAsyncContextManager
+
+CLIENT_SESSION_KEY = web.AppKey("client_session", aiohttp.ClientSession)
+RESPONSE_CACHE_KEY = web.AppKey("response_cache", ResponseCache)
+SINGLE_FLIGHT_KEY = web.AppKey("single_flight", SingleFlight)
+ITEM_CACHE_KEY = web.AppKey("item_cache", ItemCache)
+EXECUTOR_KEY = web.AppKey("executor", Executor)
+RESPONSE_STORE_KEY = web.AppKey("response_store", ResponseStore)
+SHARED_CACHE_KEY = web.AppKey("shared_cache", SharedCache)
+BATCH_CONCURRENCY_KEY = web.AppKey("batch_concurrency", int)
+STREAMING_KEY = web.AppKey("streaming", bool)
+MAX_BODY_SIZE_KEY = web.AppKey("max_body_size", int)
+JSON_CODEC_KEY = web.AppKey("json_codec", JSONCodec)
+METRICS_KEY = web.AppKey("metrics", Metrics)
+ADMISSION_CONTROL_KEY = web.AppKey("admission_control", AdmissionControl)
+RETRIES_KEY = web.AppKey("retries", int)
+RETRY_BACKOFF_KEY = web.AppKey("retry_backoff", float)
+SIMULATION_KEY = web.AppKey("simulation", Simulation)
+PAGE_REGISTRY_KEY = web.AppKey("page_registry", PageRegistry)
+COMPRESSION_KEY = web.AppKey("compression", Compression)
+PROFILER_KEY = web.AppKey("profiler", Profiler)
+
+logger = logging.getLogger(__name__)
+
+# Longest profile capture, so that a forgotten one does not last forever.
+MAX_PROFILE_SECONDS = 600.0
 
 routes = web.RouteTableDef()
 
 
+def _json_response(
+    app: web.Application,
+    data: Any,
+    *,
+    status: int = 200,
+    content_type: str = "application/json",
+) -> web.Response:
+    with timed(app.get(METRICS_KEY), "serialization"):
+        body = app[JSON_CODEC_KEY].dumps(data)
+    return web.Response(
+        body=body,
+        status=status,
+        content_type=content_type,
+        charset="utf-8",
+    )
+
+
+def _error_response(app: web.Application, error: RequestError) -> web.Response:
+    return _json_response(
+        app,
+        error.to_dict(),
+        status=error.status,
+        content_type="application/problem+json",
+    )
+
+
+def _invalid_json(exception: ValueError) -> RequestError:
+    return RequestError(
+        400, "/request/invalid", "Invalid Request", f"Invalid JSON: {exception}"
+    )
+
+
+async def _handle_request(
+    app: web.Application, request_data: dict[str, Any]
+) -> dict[str, Any]:
+    return await handle_request(
+        request_data,
+        session=app[CLIENT_SESSION_KEY],
+        response_cache=app.get(RESPONSE_CACHE_KEY),
+        single_flight=app[SINGLE_FLIGHT_KEY],
+        item_cache=app.get(ITEM_CACHE_KEY),
+        executor=app.get(EXECUTOR_KEY),
+        response_store=app.get(RESPONSE_STORE_KEY),
+        max_body_size=app.get(MAX_BODY_SIZE_KEY),
+        metrics=app.get(METRICS_KEY),
+        retries=app[RETRIES_KEY],
+        retry_backoff=app[RETRY_BACKOFF_KEY],
+        page_registry=app.get(PAGE_REGISTRY_KEY),
+        shared_cache=app.get(SHARED_CACHE_KEY),
+    )
+
+
+@asynccontextmanager
+async def _no_admission_control() -> AsyncIterator[None]:
+    yield
+
+
+def _admit(app: web.Application, url: str) -> AbstractAsyncContextManager[None]:
+    admission_control = app.get(ADMISSION_CONTROL_KEY)
+    if admission_control is None:
+        return _no_admission_control()
+    return admission_control.admit(url)
+
+
+async def _simulate(app: web.Application, request_data: dict[str, Any]) -> None:
+    simulation = app.get(SIMULATION_KEY)
+    if simulation is not None:
+        await simulation.simulate(request_data)
+
+
+class _CompressedStreamResponse(web.StreamResponse):
+    def __init__(self, compressor: Compressor, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._compressor: Compressor | None = compressor
+
+    async def write(self, data: bytes | bytearray | memoryview) -> None:
+        assert self._compressor is not None
+        # Flush, or clients may not get lines of batch responses until the
+        # whole batch is done.
+        compressed = self._compressor.compress(bytes(data))
+        compressed += self._compressor.sync_flush()
+        if compressed:
+            await super().write(compressed)
+
+    async def write_eof(self, data: bytes = b"") -> None:
+        # aiohttp calls write_eof() again once the handler returns.
+        if self._compressor is not None:
+            data = self._compressor.compress(data) + self._compressor.flush()
+            self._compressor = None
+        await super().write_eof(data)
+
+
+def _stream_response(request: web.Request, content_type: str) -> web.StreamResponse:
+    """Return a response to stream to *request*, compressing what is written
+    to it if *request* accepts a content coding of the application."""
+    headers = {"Content-Type": content_type}
+    compression = request.app.get(COMPRESSION_KEY)
+    if compression is None:
+        return web.StreamResponse(headers=headers)
+    headers["Vary"] = "Accept-Encoding"
+    coding = compression.negotiate(request.headers.get("Accept-Encoding", ""))
+    if coding is None:
+        return web.StreamResponse(headers=headers)
+    headers["Content-Encoding"] = coding
+    return _CompressedStreamResponse(compression.compressor(coding), headers=headers)
+
+
+def _can_stream(app: web.Application, request_data: dict[str, Any]) -> bool:
+    return (
+        app[STREAMING_KEY]
+        and can_stream(request_data)
+        and RESPONSE_CACHE_KEY not in app
+        and RESPONSE_STORE_KEY not in app
+        and SHARED_CACHE_KEY not in app
+    )
+
+
+async def _stream(
+    request: web.Request, request_data: dict[str, Any]
+) -> web.StreamResponse:
+    chunks = stream_request(
+        request_data,
+        session=request.app[CLIENT_SESSION_KEY],
+        max_body_size=request.app.get(MAX_BODY_SIZE_KEY),
+        json_codec=request.app[JSON_CODEC_KEY],
+        metrics=request.app.get(METRICS_KEY),
+        retries=request.app[RETRIES_KEY],
+        retry_backoff=request.app[RETRY_BACKOFF_KEY],
+    )
+    try:
+        # Errors found before the first chunk can still be reported properly.
+        first_chunk = await chunks.__anext__()
+    except RequestError as error:
+        return _error_response(request.app, error)
+    response = _stream_response(request, "application/json; charset=utf-8")
+    await response.prepare(request)
+    try:
+        await response.write(first_chunk)
+        async for chunk in chunks:
+            await response.write(chunk)
+    except RequestError as error:
+        # Too late for an error response, closing the connection lets the
+        # client know that the response is incomplete.
+        logger.warning("Aborted the response to %s: %s", request.path, error.detail)
+        if request.transport is not None:
+            request.transport.close()
+        return response
+    await response.write_eof()
+    return response
+
+
+def _validate(request_data: Any) -> None:
+    if not isinstance(request_data, dict) or not isinstance(
+        request_data.get("url"), str
+    ):
+        raise RequestError(400, "/request/invalid", "Invalid Request", "Missing url.")
+
+
+async def handle_app_request(app: web.Application, request_data: Any) -> dict[str, Any]:
+    """Return the response of the fake Zyte API application *app* to
+    *request_data*, as ``/extract`` would but without HTTP.
+
+    Errors are raised as :class:`~.api.RequestError`.
+    """
+    _validate(request_data)
+    async with _admit(app, request_data["url"]):
+        await _simulate(app, request_data)
+        return await _handle_request(app, request_data)
+
+
 @routes.post("/extract")
-async def extract(request: web.Request) -> web.Response:
-    req_data = await request.json()
-    resp_data = await handle_request(req_data)
-    return web.json_response(resp_data)
+async def extract(request: web.Request) -> web.StreamResponse:
+    try:
+        req_data = request.app[JSON_CODEC_KEY].loads(await request.read())
+    except ValueError as exception:
+        return _error_response(request.app, _invalid_json(exception))
+    try:
+        _validate(req_data)
+        async with _admit(request.app, req_data["url"]):
+            await _simulate(request.app, req_data)
+            if _can_stream(request.app, req_data):
+                return await _stream(request, req_data)
+            resp_data = await _handle_request(request.app, req_data)
+    except RequestError as error:
+        return _error_response(request.app, error)
+    return _json_response(request.app, resp_data)
+
+
+def _parse_batch(body: bytes, json_codec: JSONCodec) -> list[Any]:
+    """Return the requests of a batch, sent either as a JSON array or as
+    JSON Lines."""
+    loads = json_codec.loads
+    try:
+        if body.lstrip().startswith(b"["):
+            batch = loads(body)
+        else:
+            batch = [loads(line) for line in body.splitlines() if line.strip()]
+    except ValueError as exception:
+        raise _invalid_json(exception) from exception
+    if not isinstance(batch, list):
+        raise RequestError(
+            400,
+            "/request/invalid",
+            "Invalid Request",
+            "Expected a JSON array or JSON Lines.",
+        )
+    return batch
+
+
+async def _handle_batch_request(
+    app: web.Application, request_data: Any, semaphore: asyncio.Semaphore
+) -> dict[str, Any]:
+    try:
+        _validate(request_data)
+    except RequestError as error:
+        return error.to_dict()
+    async with semaphore:
+        try:
+            return await handle_app_request(app, request_data)
+        except RequestError as error:
+            return {"url": request_data["url"], **error.to_dict()}
+        except Exception as exception:
+            internal_error = RequestError(
+                500, "/api/internal-error", "Internal Server Error", str(exception)
+            )
+            return {"url": request_data["url"], **internal_error.to_dict()}
+
+
+@routes.post("/extract/batch")
+async def extract_batch(request: web.Request) -> web.StreamResponse:
+    json_codec = request.app[JSON_CODEC_KEY]
+    metrics = request.app.get(METRICS_KEY)
+    try:
+        batch = _parse_batch(await request.read(), json_codec)
+    except RequestError as error:
+        return _error_response(request.app, error)
+    semaphore = asyncio.Semaphore(request.app[BATCH_CONCURRENCY_KEY])
+    response = _stream_response(request, "application/x-ndjson")
+    await response.prepare(request)
+    tasks = [
+        asyncio.ensure_future(_handle_batch_request(request.app, item, semaphore))
+        for item in batch
+    ]
+    try:
+        for result in asyncio.as_completed(tasks):
+            result_data = await result
+            with timed(metrics, "serialization"):
+                line = json_codec.dumps(result_data) + b"\n"
+            await response.write(line)
+    finally:
+        # Stop working on the batch if the client is gone.
+        for task in tasks:
+            task.cancel()
+    await response.write_eof()
+    return response
+
+
+@web.middleware
+async def _metrics_middleware(
+    request: web.Request,
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    if request.path == "/metrics" or request.path.startswith("/debug/"):
+        return await handler(request)
+    metrics = request.app[METRICS_KEY]
+    metrics.requests_in_flight += 1
+    status = 500
+    try:
+        with metrics.time("request"):
+            response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as exception:
+        status = exception.status
+        raise
+    finally:
+        metrics.requests_in_flight -= 1
+        metrics.responses[status] += 1
+
+
+@web.middleware
+async def _compression_middleware(
+    request: web.Request,
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    response = await handler(request)
+    if (
+        not isinstance(response, web.Response)
+        or not isinstance(response.body, bytes)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    compression = request.app[COMPRESSION_KEY]
+    response.headers["Vary"] = "Accept-Encoding"
+    if len(response.body) < compression.min_size:
+        return response
+    coding = compression.negotiate(request.headers.get("Accept-Encoding", ""))
+    if coding is not None:
+        with timed(request.app.get(METRICS_KEY), "compression"):
+            response.body = compression.compress(response.body, coding)
+        response.headers["Content-Encoding"] = coding
+    return response
 
 
-def make_app() -> web.Application:
-    app = web.Application()
+async def _metrics(request: web.Request) -> web.Response:
+    shared_cache = request.app.get(SHARED_CACHE_KEY)
+    if shared_cache is not None:
+        # Off the event loop, for render() to report.
+        await shared_cache.count()
+    return web.Response(
+        text=request.app[METRICS_KEY].render(),
+        content_type="text/plain",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+@web.middleware
+async def _profiling_middleware(
+    request: web.Request,
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    try:
+        return await handler(request)
+    finally:
+        if request.path in ("/extract", "/extract/batch"):
+            request.app[PROFILER_KEY].request_done()
+
+
+def _query_number(
+    request: web.Request, name: str, parse: Callable[[str], float], default: float
+) -> Any:
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        number = parse(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise web.HTTPBadRequest(text=f"{name} must be a positive number.")
+    return number
+
+
+async def _profile(request: web.Request) -> web.Response:
+    profiler = request.app[PROFILER_KEY]
+    mode = request.query.get("mode", "cprofile")
+    if mode not in PROFILE_MODES:
+        raise web.HTTPBadRequest(
+            text=f"mode must be one of {', '.join(PROFILE_MODES)}."
+        )
+    seconds = min(_query_number(request, "seconds", float, 10.0), MAX_PROFILE_SECONDS)
+    requests = None
+    if "requests" in request.query:
+        requests = _query_number(request, "requests", int, 0)
+    limit = _query_number(request, "limit", int, 50)
+    content_type = "text/plain"
+    try:
+        if mode == "cprofile":
+            raw = request.query.get("format", "text") == "pstats"
+            body = await profiler.cprofile(
+                seconds,
+                requests=requests,
+                sort=request.query.get("sort", "cumulative"),
+                limit=limit,
+                raw=raw,
+            )
+            if raw:
+                content_type = "application/octet-stream"
+        elif mode == "sample":
+            body = await profiler.sample(
+                seconds,
+                requests=requests,
+                interval=_query_number(request, "interval", float, 0.005),
+            )
+        else:
+            body = await profiler.tracemalloc(
+                seconds,
+                requests=requests,
+                key_type=request.query.get("key_type", "lineno"),
+                frames=_query_number(request, "frames", int, 1),
+                limit=limit,
+            )
+    except ProfilerBusy as exception:
+        raise web.HTTPConflict(text=str(exception)) from exception
+    except ValueError as exception:
+        raise web.HTTPBadRequest(text=str(exception)) from exception
+    return web.Response(body=body, content_type=content_type)
+
+
+def make_app(
+    *,
+    limit: int = 100,
+    limit_per_host: int = 0,
+    keepalive_timeout: float = 15.0,
+    timeout: aiohttp.ClientTimeout | None = None,
+    retries: int = 0,
+    retry_backoff: float = 0.5,
+    response_cache: ResponseCache | None = None,
+    item_cache: ItemCache | None = None,
+    shared_cache: SharedCache | None = None,
+    executor: Executor | None = None,
+    response_store: ResponseStore | None = None,
+    batch_concurrency: int = 16,
+    streaming: bool = True,
+    max_body_size: int | None = None,
+    json_codec: JSONCodec | None = None,
+    metrics: Metrics | None = None,
+    max_concurrency: int | None = None,
+    max_queue: int = 0,
+    max_concurrency_per_host: int | None = None,
+    max_queue_per_host: int = 0,
+    simulation: Simulation | None = None,
+    page_registry: PageRegistry | None = None,
+    websites: EmbeddedWebsites | None = None,
+    compression: Compression | None = None,
+    profiler: Profiler | None = None,
+) -> web.Application:
+    """Return the fake Zyte API application.
+
+    *limit*, *limit_per_host* and *keepalive_timeout* configure the connection
+    pool of the client session used to fetch target websites, which is shared
+    by all requests handled by the application.
+
+    *timeout* is the timeout of requests to target websites, aiohttp's
+    default if ``None``. Requests that fail to connect or time out are sent
+    again up to *retries* times, waiting *retry_backoff* seconds before the
+    first retry and doubling that wait for each of the next ones. Requests
+    that still fail get a 520 ``/download/temporary-error`` error, and other
+    failures a 521 ``/download/internal-error`` error.
+
+    If *response_cache* is set, website responses are stored there and
+    reused for later requests for the same URL. Similarly, if *item_cache*
+    is set, extracted items are reused for later requests for the same URL
+    and response body, with a fresh ``metadata.dateDownloaded``.
+
+    If *shared_cache* is set, website responses and extracted items are also
+    stored there, and looked up there when missing from *response_cache* and
+    *item_cache*, so that the worker processes of a server can reuse each
+    other's responses and items. The caller is responsible for closing it.
+
+    Concurrent requests for the same URL share a single fetch of the website
+    response and a single extraction of each requested item type.
+
+    If *executor* is set, item extraction runs there instead of in the event
+    loop. The caller is responsible for shutting it down.
+
+    If *response_store* is set, fetched website responses are recorded into
+    it or, if it was opened for replay, website responses are read from it
+    instead of being fetched. The caller is responsible for closing it.
+
+    *batch_concurrency* is the maximum number of requests from a single
+    ``/extract/batch`` call handled concurrently.
+
+    If *streaming* is ``True``, responses to requests that only ask for
+    ``httpResponseBody`` and, optionally, ``httpResponseHeaders`` are written
+    while the website response body is being received, base64-encoding it
+    chunk by chunk, unless there is a response cache or store, which need the
+    whole body.
+
+    If *max_body_size* is set, website response bodies bigger than that
+    number of bytes are reported as a download error.
+
+    *json_codec* is used to decode requests and encode responses. It defaults
+    to the fastest installed codec, see :func:`~.codec.get_json_codec`.
+
+    If *metrics* is set, request handling is measured into it and exposed in
+    the Prometheus text format at ``/metrics``. Otherwise nothing is measured.
+
+    If *max_concurrency* is set, at most that many requests are handled at a
+    time, at most *max_queue* more wait for their turn, and any other request
+    gets a 503 ``/limits/over-global-limit`` error. *max_concurrency_per_host*
+    and *max_queue_per_host* do the same for the requests for each target
+    host, with a 429 ``/limits/over-domain-limit`` error, so that the retry
+    logic of clients can be tested. Requests in an ``/extract/batch`` call
+    count individually.
+
+    If *simulation* is set, it injects rate limiting, errors and latency into
+    the handling of every request, to make load tests of clients more
+    realistic, see :class:`~.simulation.Simulation`.
+
+    *page_registry* has the page objects used to extract items. It defaults
+    to the ones of ``zyte-test-websites``, see
+    :func:`~.registry.make_default_registry`.
+
+    If *websites* is set, they are started and closed with the application,
+    and requests for their host names are sent to them in memory instead of
+    over the network, see :class:`~.websites.EmbeddedWebsites`.
+
+    If *compression* is set, responses are compressed with the best content
+    coding that the ``Accept-Encoding`` header of each request allows, see
+    :class:`~.compression.Compression`. Compressed request bodies are always
+    accepted.
+
+    If *profiler* is set, ``/debug/profile`` captures profiles of the
+    application with it. Query parameters:
+
+    -   ``mode``: ``cprofile`` (default) for deterministic profiling of
+        function calls, ``sample`` for stack samples in the collapsed format
+        of flame graph tools, or ``tracemalloc`` for the biggest differences
+        in allocated memory.
+    -   ``seconds``: how long the capture lasts, 10 by default, 600 at most.
+    -   ``requests``: end the capture earlier, once that many ``/extract``
+        and ``/extract/batch`` requests have been handled.
+    -   ``limit``: number of functions or allocation places to report, 50 by
+        default.
+    -   ``sort`` (``cprofile``): :class:`pstats.SortKey` value, ``cumulative``
+        by default.
+    -   ``format`` (``cprofile``): ``pstats`` for a binary dump of the
+        statistics, like :meth:`cProfile.Profile.dump_stats` writes.
+    -   ``interval`` (``sample``): seconds between samples, 0.005 by default.
+    -   ``key_type`` (``tracemalloc``): ``lineno`` (default), ``filename`` or
+        ``traceback``.
+    -   ``frames`` (``tracemalloc``): frames to trace per allocation, 1 by
+        default.
+
+    Only one capture runs at a time, others get a 409 response. Do not enable
+    it on servers reachable by untrusted clients.
+    """
+
+    async def on_startup(app: web.Application) -> None:
+        connector_kwargs: dict[str, Any] = {
+            "limit": limit,
+            "limit_per_host": limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+        }
+        if websites is None:
+            connector = aiohttp.TCPConnector(**connector_kwargs)
+        else:
+            await websites.start()
+            connector = websites.connector(**connector_kwargs)
+        session_kwargs: dict[str, Any] = {}
+        if timeout is not None:
+            session_kwargs["timeout"] = timeout
+        app[CLIENT_SESSION_KEY] = aiohttp.ClientSession(
+            connector=connector, **session_kwargs
+        )
+
+    async def on_cleanup(app: web.Application) -> None:
+        await app[CLIENT_SESSION_KEY].close()
+        if websites is not None:
+            await websites.close()
+
+    middlewares = []
+    if metrics is not None:
+        middlewares.append(_metrics_middleware)
+    if compression is not None:
+        middlewares.append(_compression_middleware)
+    if profiler is not None:
+        middlewares.append(_profiling_middleware)
+    app = web.Application(middlewares=middlewares)
     app.add_routes(routes)
+    app[SINGLE_FLIGHT_KEY] = SingleFlight()
+    app[BATCH_CONCURRENCY_KEY] = batch_concurrency
+    app[STREAMING_KEY] = streaming
+    app[JSON_CODEC_KEY] = json_codec or get_json_codec()
+    app[RETRIES_KEY] = retries
+    app[RETRY_BACKOFF_KEY] = retry_backoff
+    if max_body_size is not None:
+        app[MAX_BODY_SIZE_KEY] = max_body_size
+    if response_cache is not None:
+        app[RESPONSE_CACHE_KEY] = response_cache
+    if item_cache is not None:
+        app[ITEM_CACHE_KEY] = item_cache
+    if executor is not None:
+        app[EXECUTOR_KEY] = executor
+    if response_store is not None:
+        app[RESPONSE_STORE_KEY] = response_store
+    if shared_cache is not None:
+        app[SHARED_CACHE_KEY] = shared_cache
+    if metrics is not None:
+        app[METRICS_KEY] = metrics
+        if response_cache is not None:
+            metrics.caches["response"] = response_cache
+        if item_cache is not None:
+            metrics.caches["item"] = item_cache
+        if shared_cache is not None:
+            metrics.caches["shared"] = shared_cache
+        app.router.add_get("/metrics", _metrics)
+    if simulation is not None:
+        app[SIMULATION_KEY] = simulation
+    if page_registry is not None:
+        app[PAGE_REGISTRY_KEY] = page_registry
+    if compression is not None:
+        app[COMPRESSION_KEY] = compression
+    if profiler is not None:
+        app[PROFILER_KEY] = profiler
+        app.router.add_get("/debug/profile", _profile)
+    if max_concurrency is not None or max_concurrency_per_host is not None:
+        app[ADMISSION_CONTROL_KEY] = AdmissionControl(
+            max_concurrency=max_concurrency,
+            max_queue=max_queue,
+            max_concurrency_per_host=max_concurrency_per_host,
+            max_queue_per_host=max_queue_per_host,
+        )
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
     return app
 
 
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m fake_zyte_api.main")
+    parser.add_argument("port", type=int)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help="total timeout of requests to websites (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help="timeout to connect to websites (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="timeout to read each chunk of a website response (default: none)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        metavar="N",
+        help=(
+            "times to retry requests to websites that fail to connect or time out"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=0.5,
+        metavar="SECONDS",
+        help=(
+            "time to wait before the first retry, doubled for each next retry"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--limit-per-host",
+        type=int,
+        default=0,
+        metavar="N",
+        help=(
+            "maximum number of concurrent connections to each website"
+            " (default: no limit)"
+        ),
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="cache website responses in memory, by URL",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=64,
+        metavar="MIB",
+        help="maximum size of the response cache, in MiB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="time after which cached responses expire (default: never)",
+    )
+    parser.add_argument(
+        "--item-cache",
+        action="store_true",
+        help="cache extracted items in memory, by URL and response body",
+    )
+    parser.add_argument(
+        "--item-cache-size",
+        type=int,
+        default=1024,
+        metavar="ITEMS",
+        help="maximum number of cached items (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shared-cache",
+        action="store_true",
+        help=(
+            "also cache website responses and extracted items in a cache shared"
+            " by all --workers, emptied on start"
+        ),
+    )
+    parser.add_argument(
+        "--shared-cache-size",
+        type=int,
+        default=256,
+        metavar="MIB",
+        help="maximum size of the shared cache, in MiB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shared-cache-path",
+        metavar="PATH",
+        help=(
+            f"file of the shared cache (default: {default_shared_cache_path('PORT')})"
+        ),
+    )
+    parser.add_argument(
+        "--executor",
+        choices=["thread", "process"],
+        help="extract items in a thread or process pool instead of the event loop",
+    )
+    parser.add_argument(
+        "--executor-workers",
+        type=int,
+        metavar="N",
+        help="number of executor workers (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--batch-concurrency",
+        type=int,
+        default=16,
+        metavar="N",
+        help=(
+            "maximum number of requests of an /extract/batch call handled"
+            " concurrently (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--max-body-size",
+        type=int,
+        metavar="MIB",
+        help="maximum size of website response bodies, in MiB (default: no limit)",
+    )
+    parser.add_argument(
+        "--no-streaming",
+        dest="streaming",
+        action="store_false",
+        help="build every response in memory before sending it",
+    )
+    parser.add_argument(
+        "--json",
+        choices=JSON_CODEC_NAMES,
+        help="JSON library to use (default: the fastest installed one)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        metavar="N",
+        help="maximum number of requests handled at a time (default: no limit)",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=0,
+        metavar="N",
+        help=(
+            "maximum number of requests waiting for --max-concurrency, more get"
+            " a 503 response (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--max-concurrency-per-host",
+        type=int,
+        metavar="N",
+        help=(
+            "maximum number of requests for the same website handled at a time"
+            " (default: no limit)"
+        ),
+    )
+    parser.add_argument(
+        "--max-queue-per-host",
+        type=int,
+        default=0,
+        metavar="N",
+        help=(
+            "maximum number of requests waiting for --max-concurrency-per-host,"
+            " more get a 429 response (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--simulation",
+        metavar="PROFILE",
+        help=(
+            "JSON file with the latency, errors and rate limit to simulate,"
+            " see fake_zyte_api.simulation.Simulation.from_dict"
+        ),
+    )
+    parser.add_argument(
+        "--simulation-seed",
+        type=int,
+        metavar="SEED",
+        help="random seed of the simulation (default: the one in PROFILE)",
+    )
+    parser.add_argument(
+        "--pages",
+        action="append",
+        default=[],
+        metavar="CONFIG",
+        help=(
+            "JSON file with page objects to register, may be repeated, see"
+            " fake_zyte_api.registry.PageRegistry.load_config"
+        ),
+    )
+    parser.add_argument(
+        "--no-entry-points",
+        dest="entry_points",
+        action="store_false",
+        help="do not register the page objects of fake_zyte_api.pages entry points",
+    )
+    parser.add_argument(
+        "--embedded-websites",
+        action="store_true",
+        help=(
+            "run the zyte-test-websites apps in the server process, at"
+            f" {', '.join(DEFAULT_WEBSITES)}, and fetch them without sockets"
+        ),
+    )
+    parser.add_argument(
+        "--website",
+        action="append",
+        default=[],
+        metavar="HOST=MODULE:FUNCTION",
+        help=(
+            "run the aiohttp app returned by FUNCTION in the server process, at"
+            " HOST, instead of the zyte-test-websites apps, may be repeated"
+        ),
+    )
+    parser.add_argument(
+        "--compression",
+        action="store_true",
+        help="compress responses as allowed by the Accept-Encoding request header",
+    )
+    parser.add_argument(
+        "--compression-min-size",
+        type=int,
+        default=1024,
+        metavar="BYTES",
+        help=(
+            "minimum size of the responses to compress, unless streamed"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--compression-level",
+        action="append",
+        default=[],
+        metavar="CODING=LEVEL",
+        help=(
+            "compression level of a content coding (zstd, br or gzip), may be"
+            " repeated (default: "
+            + ", ".join(f"{name}={level}" for name, level in DEFAULT_LEVELS.items())
+            + ")"
+        ),
+    )
+    parser.add_argument(
+        "--profiling",
+        action="store_true",
+        help=(
+            "capture profiles on demand at /debug/profile, see"
+            " fake_zyte_api.main.make_app"
+        ),
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="measure request handling and expose the results at /metrics",
+    )
+    store_group = parser.add_mutually_exclusive_group()
+    store_group.add_argument(
+        "--record",
+        metavar="DIR",
+        help="record fetched website responses into a response store",
+    )
+    store_group.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="serve website responses from a response store, without fetching",
+    )
+    parser.add_argument(
+        "--backlog",
+        type=int,
+        default=1024,
+        metavar="N",
+        help=(
+            "maximum number of pending connections to the server (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--keepalive-timeout",
+        type=float,
+        default=75.0,
+        metavar="SECONDS",
+        help=(
+            "time to keep idle client connections to the server open"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--access-log",
+        action="store_true",
+        help="log every request to stderr, which lowers throughput",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "number of server processes, sharing the port through SO_REUSEPORT"
+            " (default: %(default)s)"
+        ),
+    )
+    args = parser.parse_args(argv)
+    if args.record and args.workers > 1:
+        parser.error("--record cannot be combined with --workers")
+    if args.shared_cache_path is None:
+        args.shared_cache_path = str(default_shared_cache_path(str(args.port)))
+    for website in args.website:
+        host, sep, path = website.partition("=")
+        if not host or not sep or ":" not in path:
+            parser.error(f"Expected --website HOST=MODULE:FUNCTION, got {website!r}")
+    args.compression_levels = {}
+    for compression_level in args.compression_level:
+        coding, _, level = compression_level.partition("=")
+        if coding not in DEFAULT_LEVELS or not level.lstrip("-").isdigit():
+            parser.error(
+                f"Expected --compression-level CODING=LEVEL, got {compression_level!r}"
+            )
+        args.compression_levels[coding] = int(level)
+    return args
+
+
+def make_executor(kind: str, max_workers: int | None = None) -> Executor:
+    """Return a thread pool or a process pool, depending on *kind*."""
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers)
+    if kind == "process":
+        # Forked workers would inherit the running event loop of the server.
+        context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers, mp_context=context)
+    raise ValueError(f"Unknown executor kind: {kind!r}")
+
+
+def make_app_from_args(args: argparse.Namespace, stack: ExitStack) -> web.Application:
+    """Return an application configured by parsed command-line *args*.
+
+    Callbacks to release the resources of the application, like executors,
+    are pushed into *stack*.
+    """
+    response_cache = None
+    if args.cache:
+        response_cache = make_response_cache(
+            max_size=args.cache_size * 1024 * 1024, ttl=args.cache_ttl
+        )
+    item_cache = None
+    if args.item_cache:
+        item_cache = make_item_cache(max_size=args.item_cache_size)
+    shared_cache = None
+    if args.shared_cache:
+        shared_cache = SharedCache(
+            args.shared_cache_path,
+            max_size=args.shared_cache_size * 1024 * 1024,
+            ttl=args.cache_ttl,
+        )
+        stack.callback(shared_cache.close)
+    executor = None
+    if args.executor:
+        executor = make_executor(args.executor, args.executor_workers)
+        stack.callback(executor.shutdown)
+    response_store = None
+    if args.record or args.replay:
+        response_store = ResponseStore(
+            args.replay or args.record, replay=bool(args.replay)
+        )
+        stack.callback(response_store.close)
+    simulation = None
+    if args.simulation:
+        simulation = Simulation.from_file(args.simulation, seed=args.simulation_seed)
+    page_registry = make_default_registry()
+    if args.entry_points:
+        page_registry.load_entry_points()
+    for path in args.pages:
+        page_registry.load_config(path)
+    websites = None
+    if args.website:
+        websites = EmbeddedWebsites(
+            dict(website.split("=", 1) for website in args.website)
+        )
+    elif args.embedded_websites:
+        websites = EmbeddedWebsites()
+    compression = None
+    if args.compression:
+        compression = Compression(
+            min_size=args.compression_min_size, levels=args.compression_levels
+        )
+    return make_app(
+        limit_per_host=args.limit_per_host,
+        timeout=aiohttp.ClientTimeout(
+            total=args.timeout,
+            sock_connect=args.connect_timeout,
+            sock_read=args.read_timeout,
+        ),
+        retries=args.retries,
+        retry_backoff=args.retry_backoff,
+        response_cache=response_cache,
+        item_cache=item_cache,
+        shared_cache=shared_cache,
+        executor=executor,
+        response_store=response_store,
+        batch_concurrency=args.batch_concurrency,
+        streaming=args.streaming,
+        json_codec=get_json_codec(args.json),
+        max_body_size=(
+            None if args.max_body_size is None else args.max_body_size * 1024 * 1024
+        ),
+        metrics=Metrics() if args.metrics else None,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        max_concurrency_per_host=args.max_concurrency_per_host,
+        max_queue_per_host=args.max_queue_per_host,
+        simulation=simulation,
+        page_registry=page_registry,
+        websites=websites,
+        compression=compression,
+        profiler=Profiler() if args.profiling else None,
+    )
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Run a server configured by parsed command-line *args*."""
+    with ExitStack() as stack:
+        app = make_app_from_args(args, stack)
+        reuse_port = args.workers > 1
+        access_log = None
+        if args.access_log:
+            access_log = logging.getLogger("aiohttp.access")
+            access_log.setLevel(logging.INFO)
+            access_log.addHandler(logging.StreamHandler())
+        web.run_app(
+            app,
+            port=args.port,
+            backlog=args.backlog,
+            keepalive_timeout=args.keepalive_timeout,
+            access_log=access_log,
+            reuse_port=reuse_port,
+            # Only print the address once, from main().
+            print=None if reuse_port else print,
+        )
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
+    print(f"Endpoint: http://127.0.0.1:{args.port}/extract")
+    if args.shared_cache:
+        # Do not serve responses cached by an earlier run.
+        remove_shared_cache(args.shared_cache_path)
+    if args.workers > 1:
+        run_workers(serve, (args,), workers=args.workers)
+    else:
+        serve(args)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 1:
-        print(f"Usage: {sys.argv[0]} <port>")
-        sys.exit(1)
-
-    port = int(sys.argv[1])
-    print(f"Endpoint: http://127.0.0.1:{port}/extract")
-    app = make_app()
-    web.run_app(app, port=port)
+    main()
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from .cache import LRUCache, SharedCache
+
+PREFIX = "fake_zyte_api"
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels: dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels.items()
+    )
+    return f"{{{pairs}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Metrics of a fake Zyte API server, in the Prometheus text format.
+
+    Stages timed into ``fake_zyte_api_stage_duration_seconds`` are:
+
+    -   ``request``: handling of a whole ``/extract`` or ``/extract/batch``
+        request.
+    -   ``fetch``: download of a website response, which, if streamed, includes
+        sending it.
+    -   ``base64``: base64-encoding of ``httpResponseBody``.
+    -   ``decode``: decoding of the response body for ``browserHtml``.
+    -   ``extraction``: extraction of the requested items.
+    -   ``serialization``: JSON encoding of the response.
+    -   ``compression``: compression of the response, when not streamed.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.stage_durations: dict[str, Histogram] = {}
+        self.responses: Counter[int] = Counter()
+        self.upstream_responses: Counter[int] = Counter()
+        self.items: Counter[str] = Counter()
+        self.requests_in_flight = 0
+        self.upstream_requests_in_flight = 0
+        self.caches: dict[str, LRUCache[Any, Any] | SharedCache] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        histogram = self.stage_durations.get(stage)
+        if histogram is None:
+            histogram = self.stage_durations[stage] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, perf_counter() - start)
+
+    @contextmanager
+    def upstream_request(self) -> Iterator[None]:
+        self.upstream_requests_in_flight += 1
+        try:
+            with self.time("fetch"):
+                yield
+        finally:
+            self.upstream_requests_in_flight -= 1
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        def add(
+            name: str,
+            kind: str,
+            help: str,
+            samples: list[tuple[str, dict[str, Any], float]],
+        ) -> None:
+            lines.append(f"# HELP {PREFIX}_{name} {help}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            lines.extend(
+                f"{PREFIX}_{name}{suffix}{_format_labels(labels)} {value}"
+                for suffix, labels, value in samples
+            )
+
+        add(
+            "requests_in_flight",
+            "gauge",
+            "Requests being handled.",
+            [("", {}, self.requests_in_flight)],
+        )
+        add(
+            "upstream_requests_in_flight",
+            "gauge",
+            "Website responses being downloaded.",
+            [("", {}, self.upstream_requests_in_flight)],
+        )
+        add(
+            "responses_total",
+            "counter",
+            "Responses sent, by status code.",
+            [("", {"status": k}, v) for k, v in sorted(self.responses.items())],
+        )
+        add(
+            "upstream_responses_total",
+            "counter",
+            "Website responses downloaded, by status code.",
+            [
+                ("", {"status": k}, v)
+                for k, v in sorted(self.upstream_responses.items())
+            ],
+        )
+        add(
+            "items_total",
+            "counter",
+            "Items requested, by type.",
+            [("", {"type": k}, v) for k, v in sorted(self.items.items())],
+        )
+        samples: list[tuple[str, dict[str, Any], float]] = []
+        for stage, histogram in sorted(self.stage_durations.items()):
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                cumulative += count
+                samples.append(("_bucket", {"stage": stage, "le": bound}, cumulative))
+            samples.append(("_sum", {"stage": stage}, histogram.sum))
+            samples.append(("_count", {"stage": stage}, histogram.count))
+        add(
+            "stage_duration_seconds",
+            "histogram",
+            "Time spent in each stage of request handling.",
+            samples,
+        )
+        if self.caches:
+            caches = sorted(self.caches.items())
+            add(
+                "cache_hits_total",
+                "counter",
+                "Cache hits.",
+                [("", {"cache": name}, cache.hits) for name, cache in caches],
+            )
+            add(
+                "cache_misses_total",
+                "counter",
+                "Cache misses.",
+                [("", {"cache": name}, cache.misses) for name, cache in caches],
+            )
+            add(
+                "cache_entries",
+                "gauge",
+                "Cache entries.",
+                [("", {"cache": name}, len(cache)) for name, cache in caches],
+            )
+        return "\n".join(lines) + "\n"
+
+
+_NO_METRICS: AbstractContextManager[None] = nullcontext()
+
+
+def timed(metrics: Metrics | None, stage: str) -> AbstractContextManager[None]:
+    """Return a context manager that times *stage* into *metrics*, or that does
+    nothing if *metrics* is ``None``."""
+    if metrics is None:
+        return _NO_METRICS
+    return metrics.time(stage)
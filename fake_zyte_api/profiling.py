@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from types import CodeType
+
+PROFILE_MODES = ("cprofile", "sample", "tracemalloc")
+
+# Allocations of the profiler itself and of imports are noise.
+_TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern=__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern="<frozen importlib._*>"),
+    tracemalloc.Filter(inclusive=False, filename_pattern="<unknown>"),
+)
+
+
+class ProfilerBusy(Exception):
+    """Raised when a capture is requested while another one is running."""
+
+
+def _frame_name(code: CodeType) -> str:
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _sample(
+    thread_id: int, interval: float, stop: threading.Event, stacks: Counter[str]
+) -> None:
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        if names:
+            stacks[";".join(reversed(names))] += 1
+
+
+class Profiler:
+    """Captures profiles of a running server on demand.
+
+    A capture lasts a number of seconds or until a number of requests have
+    been handled, whichever comes first, and only one capture runs at a
+    time. Requests are counted by calling :meth:`request_done`.
+
+    Captures profile the thread running the event loop, not executor
+    workers.
+    """
+
+    def __init__(self) -> None:
+        self._busy = False
+        self._remaining_requests: int | None = None
+        self._requests_done: asyncio.Event | None = None
+
+    def request_done(self) -> None:
+        """Count a handled request towards the running capture, if any."""
+        if self._remaining_requests is None or self._requests_done is None:
+            return
+        self._remaining_requests -= 1
+        if self._remaining_requests <= 0:
+            self._requests_done.set()
+
+    async def _wait(self, seconds: float, requests: int | None) -> None:
+        if requests is None:
+            await asyncio.sleep(seconds)
+            return
+        self._remaining_requests = requests
+        self._requests_done = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._requests_done.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._remaining_requests = None
+            self._requests_done = None
+
+    @contextmanager
+    def _capturing(self) -> Iterator[None]:
+        if self._busy:
+            raise ProfilerBusy("Another capture is running.")
+        self._busy = True
+        try:
+            yield
+        finally:
+            self._busy = False
+
+    async def cprofile(
+        self,
+        seconds: float,
+        *,
+        requests: int | None = None,
+        sort: str = "cumulative",
+        limit: int = 50,
+        raw: bool = False,
+    ) -> bytes:
+        """Profile the event loop thread with :mod:`cProfile`.
+
+        Return the *limit* top functions, sorted by *sort*, as printed by
+        :meth:`pstats.Stats.print_stats`, or, if *raw* is ``True``, the data
+        that :meth:`cProfile.Profile.dump_stats` would write, which tools
+        like snakeviz can read.
+        """
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            raise ValueError(f"Unknown sort key: {sort!r}")
+        with self._capturing():
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await self._wait(seconds, requests)
+            finally:
+                profile.disable()
+        if raw:
+            profile.create_stats()
+            return marshal.dumps(profile.stats)
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue().encode()
+
+    async def sample(
+        self,
+        seconds: float,
+        *,
+        requests: int | None = None,
+        interval: float = 0.005,
+    ) -> bytes:
+        """Sample the stack of the event loop thread every *interval*
+        seconds, and return the sampled stacks in the collapsed format read
+        by flamegraph.pl, speedscope and similar tools."""
+        stacks: Counter[str] = Counter()
+        with self._capturing():
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=_sample,
+                args=(threading.get_ident(), interval, stop, stacks),
+                daemon=True,
+            )
+            sampler.start()
+            try:
+                await self._wait(seconds, requests)
+            finally:
+                stop.set()
+                sampler.join()
+        return "".join(
+            f"{stack} {count}\n" for stack, count in sorted(stacks.items())
+        ).encode()
+
+    async def tracemalloc(
+        self,
+        seconds: float,
+        *,
+        requests: int | None = None,
+        key_type: str = "lineno",
+        frames: int = 1,
+        limit: int = 50,
+    ) -> bytes:
+        """Return the *limit* places with the biggest changes in allocated
+        memory during the capture, grouped by *key_type* (``"lineno"``,
+        ``"filename"`` or ``"traceback"``), tracing *frames* frames per
+        allocation."""
+        if key_type not in ("lineno", "filename", "traceback"):
+            raise ValueError(f"Unknown key type: {key_type!r}")
+        with self._capturing():
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start(frames)
+            try:
+                before = tracemalloc.take_snapshot()
+                await self._wait(seconds, requests)
+                after = tracemalloc.take_snapshot()
+            finally:
+                if not was_tracing:
+                    tracemalloc.stop()
+        differences = after.filter_traces(_TRACEMALLOC_FILTERS).compare_to(
+            before.filter_traces(_TRACEMALLOC_FILTERS), key_type
+        )
+        lines = []
+        for difference in differences[:limit]:
+            lines.append(str(difference))
+            if key_type == "traceback":
+                lines.extend(difference.traceback.format())
+        return "".join(f"{line}\n" for line in lines).encode()
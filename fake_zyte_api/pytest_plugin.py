@@ -0,0 +1,28 @@
+"""pytest fixtures for tests that use fake-zyte-api.
+
+Enable them with ``pytest_plugins = ["fake_zyte_api.pytest_plugin"]`` in
+your ``conftest.py``.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest_asyncio
+
+from .client import InProcessZyteAPI
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+
+@pytest_asyncio.fixture
+async def fake_zyte_api_client() -> AsyncIterator[InProcessZyteAPI]:
+    """Zyte API client that handles requests in the current process, with a
+    fake Zyte API application with the default options."""
+    client = InProcessZyteAPI()
+    await client.start()
+    try:
+        yield client
+    finally:
+        await client.close()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+import re
+import sys
+from fnmatch import translate
+from functools import cache
+from importlib import import_module
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Union
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from web_poet import WebPage
+
+    PageSpec = Union[type[WebPage[Any]], str]
+
+ENTRY_POINT_GROUP = "fake_zyte_api.pages"
+
+# Request fields that are not items.
+_RESERVED_KEYS = frozenset(
+    {"url", "httpResponseBody", "httpResponseHeaders", "browserHtml"}
+)
+
+# Page objects of zyte-test-websites, imported on first use of their item type,
+# because importing them, and web-poet and zyte-common-items with them, is slow.
+DEFAULT_PAGES = {
+    "product": "zyte_test_websites.ecommerce.extraction:TestProductPage",
+    "productList": "zyte_test_websites.ecommerce.extraction:TestProductListPage",
+    "productNavigation": (
+        "zyte_test_websites.ecommerce.extraction:TestProductNavigationPage"
+    ),
+    "jobPosting": "zyte_test_websites.jobs.extraction:TestJobPostingPage",
+    "jobPostingNavigation": (
+        "zyte_test_websites.jobs.extraction:TestJobPostingNavigationPage"
+    ),
+    "article": "zyte_test_websites.articles.extraction:TestArticlePage",
+    "articleNavigation": (
+        "zyte_test_websites.articles.extraction:TestArticleNavigationPage"
+    ),
+}
+
+
+@cache
+def load_object(path: str) -> Any:
+    """Return the object at *path*, a ``"module:name"`` string."""
+    module_name, _, name = path.partition(":")
+    if not name:
+        raise ValueError(f"Expected a 'module:name' path, got {path!r}")
+    return getattr(import_module(module_name), name)
+
+
+class _Rule:
+    def __init__(self, page: PageSpec, urls: Iterable[str] | None) -> None:
+        self.page = page
+        self.pattern = None
+        if urls is not None:
+            self.pattern = re.compile("|".join(translate(url) for url in urls))
+
+    def matches(self, url: str) -> bool:
+        return self.pattern is None or self.pattern.match(url) is not None
+
+    def load(self) -> type[WebPage[Any]]:
+        if isinstance(self.page, str):
+            self.page = load_object(self.page)
+            assert not isinstance(self.page, str)
+        return self.page
+
+
+class PageRegistry:
+    """Page objects that extract each type of item, e.g. ``product``.
+
+    When several page objects are registered for the same item type, the one
+    registered last whose URL patterns match the request URL is used.
+    """
+
+    def __init__(self) -> None:
+        self._rules: dict[str, list[_Rule]] = {}
+
+    def register(
+        self, item_type: str, page: PageSpec, *, urls: Iterable[str] | None = None
+    ) -> None:
+        """Register *page* to extract *item_type* items.
+
+        *page* is a web-poet page object class or a ``"module:ClassName"``
+        string, imported when first needed.
+
+        *urls* are glob patterns, like ``"https://shop.example/product/*"``,
+        matched against the whole request URL. If ``None``, *page* is used for
+        any URL.
+        """
+        if item_type in _RESERVED_KEYS:
+            raise ValueError(f"{item_type!r} is not an item type")
+        self._rules.setdefault(item_type, []).insert(0, _Rule(page, urls))
+
+    def __contains__(self, item_type: object) -> bool:
+        return item_type in self._rules
+
+    def get(self, item_type: str, url: str) -> type[WebPage[Any]] | None:
+        """Return the page object class to extract *item_type* from *url*, if
+        any."""
+        for rule in self._rules.get(item_type, ()):
+            if rule.matches(url):
+                return rule.load()
+        return None
+
+    def get_pages(
+        self, request_data: Mapping[str, Any], url: str
+    ) -> dict[str, type[WebPage[Any]]]:
+        """Return the page object classes for the items requested in
+        *request_data*, by item type."""
+        pages = {}
+        for key in request_data:
+            if key in self._rules:
+                page = self.get(key, url)
+                if page is not None:
+                    pages[key] = page
+        return pages
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP) -> None:
+        """Call the functions of the *group* entry points with this registry,
+        so that installed packages can register their page objects."""
+        if sys.version_info >= (3, 10):
+            group_entry_points = entry_points(group=group)
+        else:
+            group_entry_points = entry_points().get(group, ())
+        for entry_point in group_entry_points:
+            entry_point.load()(self)
+
+    def load_config(self, path: str | Path) -> None:
+        """Register the page objects listed in the JSON file at *path*::
+
+            {
+                "pages": [
+                    {
+                        "item": "product",
+                        "page": "my_project.pages:ProductPage",
+                        "urls": ["https://shop.example/product/*"]
+                    }
+                ]
+            }
+
+        ``urls`` is optional.
+        """
+        config = json.loads(Path(path).read_text(encoding="utf-8"))
+        try:
+            for entry in config["pages"]:
+                self.register(entry["item"], entry["page"], urls=entry.get("urls"))
+        except (KeyError, TypeError) as exception:
+            raise ValueError(
+                f"Invalid page config {path}: {exception!r}"
+            ) from exception
+
+
+def make_default_registry() -> PageRegistry:
+    """Return a registry with the page objects of ``zyte-test-websites``."""
+    registry = PageRegistry()
+    for item_type, page in DEFAULT_PAGES.items():
+        registry.register(item_type, page)
+    return registry
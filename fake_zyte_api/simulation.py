@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+from pathlib import Path
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+from .api import RequestError
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+
+    Sampler = Callable[[random.Random], float]
+
+_ERRORS = {
+    429: ("/limits/over-user-limit", "User Rate Limit Exceeded"),
+    500: ("/api/internal-error", "Internal Server Error"),
+    503: ("/limits/over-global-limit", "Global Concurrency Limit Exceeded"),
+    520: ("/download/temporary-error", "Temporary Downloading Error"),
+    521: ("/download/internal-error", "Internal Downloading Error"),
+}
+
+
+def _error(status: int, detail: str) -> RequestError:
+    type, title = _ERRORS[status]
+    return RequestError(status, type, title, detail)
+
+
+def _make_sampler(spec: Mapping[str, Any]) -> Sampler:
+    """Return a function that returns a random latency, in seconds, following
+    the distribution described by *spec*."""
+    distribution = spec.get("distribution", "constant")
+    if distribution == "constant":
+        value = float(spec["value"])
+        return lambda rng: value
+    if distribution == "uniform":
+        low, high = float(spec["min"]), float(spec["max"])
+        return lambda rng: rng.uniform(low, high)
+    if distribution == "normal":
+        mean, stddev = float(spec["mean"]), float(spec["stddev"])
+        return lambda rng: max(0.0, rng.gauss(mean, stddev))
+    if distribution == "lognormal":
+        mu, sigma = math.log(float(spec["median"])), float(spec["sigma"])
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    if distribution == "exponential":
+        lambd = 1 / float(spec["mean"])
+        return lambda rng: rng.expovariate(lambd)
+    raise ValueError(f"Unknown latency distribution: {distribution!r}")
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = monotonic()
+
+    def take(self) -> bool:
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class Simulation:
+    """Makes the server behave more like the real Zyte API under load.
+
+    Each request is first checked against a rate limit of
+    *requests_per_second*, allowing bursts of up to *burst* requests, and
+    gets a 429 error if over it. Then it fails with a random error, if any,
+    with the probabilities in *error_rates*, a mapping of status codes (429,
+    500, 503, 520 or 521) to rates between 0 and 1. Otherwise, it is delayed
+    by a random latency: the highest one of the *latency* samplers for the
+    outputs the request asks for, or of its ``"default"`` sampler if there
+    are none.
+
+    *seed* seeds the random number generator, to get the same errors and
+    latencies every time for the same sequence of requests.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency: Mapping[str, Sampler] | None = None,
+        error_rates: Mapping[int, float] | None = None,
+        requests_per_second: float | None = None,
+        burst: float | None = None,
+        seed: int | None = None,
+    ) -> None:
+        self._latency = dict(latency or {})
+        self._default_latency = self._latency.pop("default", None)
+        self._errors = []
+        cumulative_rate = 0.0
+        for status, rate in (error_rates or {}).items():
+            if status not in _ERRORS:
+                raise ValueError(f"Unsupported error status code: {status}")
+            cumulative_rate += rate
+            self._errors.append((cumulative_rate, status))
+        if cumulative_rate > 1:
+            raise ValueError("Error rates add up to more than 1.")
+        self._bucket = None
+        if requests_per_second is not None:
+            self._bucket = _TokenBucket(
+                requests_per_second,
+                max(1.0, requests_per_second) if burst is None else burst,
+            )
+        self._random = random.Random(seed)  # noqa: S311
+
+    @classmethod
+    def from_dict(
+        cls, profile: Mapping[str, Any], *, seed: int | None = None
+    ) -> Simulation:
+        """Return a simulation configured by a *profile* like::
+
+            {
+                "seed": 42,
+                "latency": {
+                    "default": {"distribution": "constant", "value": 0.2},
+                    "httpResponseBody": {"distribution": "lognormal", "median": 0.5, "sigma": 0.4},
+                    "browserHtml": {"distribution": "uniform", "min": 2, "max": 6}
+                },
+                "errors": {"429": 0.02, "520": 0.01},
+                "rate_limit": {"requests_per_second": 50, "burst": 100}
+            }
+
+        Latency distributions are ``constant`` (``value``), ``uniform``
+        (``min``, ``max``), ``normal`` (``mean``, ``stddev``), ``lognormal``
+        (``median``, ``sigma``) and ``exponential`` (``mean``), in seconds.
+
+        *seed*, if not ``None``, overrides the seed of *profile*.
+        """
+        try:
+            latency = {
+                output: _make_sampler(spec)
+                for output, spec in profile.get("latency", {}).items()
+            }
+            error_rates = {
+                int(status): float(rate)
+                for status, rate in profile.get("errors", {}).items()
+            }
+            rate_limit = profile.get("rate_limit", {})
+            return cls(
+                latency=latency,
+                error_rates=error_rates,
+                requests_per_second=rate_limit.get("requests_per_second"),
+                burst=rate_limit.get("burst"),
+                seed=profile.get("seed") if seed is None else seed,
+            )
+        except (AttributeError, KeyError, TypeError, ValueError) as exception:
+            raise ValueError(
+                f"Invalid simulation profile: {exception!r}"
+            ) from exception
+
+    @classmethod
+    def from_file(cls, path: str | Path, *, seed: int | None = None) -> Simulation:
+        """Return a simulation configured by the JSON profile at *path*, see
+        :meth:`from_dict`."""
+        profile = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls.from_dict(profile, seed=seed)
+
+    def latency(self, request_data: Mapping[str, Any]) -> float:
+        """Return a random latency for *request_data*, in seconds."""
+        samplers = [
+            sampler
+            for output, sampler in self._latency.items()
+            if output in request_data
+        ]
+        if not samplers and self._default_latency is not None:
+            samplers = [self._default_latency]
+        return max((sampler(self._random) for sampler in samplers), default=0.0)
+
+    async def simulate(self, request_data: Mapping[str, Any]) -> None:
+        """Raise a simulated :class:`~.api.RequestError` for *request_data*,
+        or wait for a simulated latency."""
+        if self._bucket is not None and not self._bucket.take():
+            raise _error(429, "Too many requests per second.")
+        draw = self._random.random()
+        for cumulative_rate, status in self._errors:
+            if draw < cumulative_rate:
+                raise _error(status, "Simulated error.")
+        delay = self.latency(request_data)
+        if delay > 0:
+            await asyncio.sleep(delay)
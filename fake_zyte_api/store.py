@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import json
+import mmap
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, TextIO
+
+from .api import WebsiteResponse
+
+if TYPE_CHECKING:
+    from os import PathLike
+
+INDEX_FILE_NAME = "index.jsonl"
+BODIES_FILE_NAME = "bodies.bin"
+
+
+class ResponseStore:
+    """On-disk store of website responses, keyed by URL.
+
+    A store is a directory with 2 append-only files: one with the
+    concatenated response bodies, and a JSON Lines index with the URL, status
+    code, headers, and body offset and length of every response.
+    Bodies are read through a memory map of the bodies file.
+
+    If a URL is stored more than once, the last response wins.
+
+    If *replay* is ``True``, the fake Zyte API serves responses from the store
+    instead of fetching them. Otherwise, it records fetched responses into
+    the store. Only 1 process at a time may record into a given store.
+    """
+
+    def __init__(self, path: str | PathLike[str], *, replay: bool = False) -> None:
+        self.path = Path(path)
+        self.replay = replay
+        self._index: dict[str, dict[str, Any]] = {}
+        self._map: mmap.mmap | None = None
+        self._index_file: TextIO | None = None
+        self._bodies_file: BinaryIO
+        if replay:
+            self._bodies_file = (self.path / BODIES_FILE_NAME).open("rb")
+        else:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._index_file = (self.path / INDEX_FILE_NAME).open("a", encoding="utf-8")
+            self._bodies_file = (self.path / BODIES_FILE_NAME).open("a+b")
+        with (self.path / INDEX_FILE_NAME).open(encoding="utf-8") as index_file:
+            for line in index_file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._index[entry["url"]] = entry
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._index
+
+    def get(self, url: str) -> WebsiteResponse | None:
+        entry = self._index.get(url)
+        if entry is None:
+            return None
+        start = entry["offset"]
+        end = start + entry["length"]
+        body = b""
+        if end > start:
+            if self._map is None or len(self._map) < end:
+                self._remap()
+            assert self._map is not None
+            body = self._map[start:end]
+        return WebsiteResponse(
+            status=entry["status"],
+            headers=tuple((name, value) for name, value in entry["headers"]),
+            body=body,
+        )
+
+    def put(self, url: str, response: WebsiteResponse) -> None:
+        if self._index_file is None:
+            raise ValueError(f"{self.path} was opened for replay, it is read-only")
+        self._bodies_file.seek(0, 2)
+        offset = self._bodies_file.tell()
+        self._bodies_file.write(response.body)
+        # Write the body before its index entry, so that an interrupted write
+        # does not leave the index pointing to missing data.
+        self._bodies_file.flush()
+        entry = {
+            "url": url,
+            "status": response.status,
+            "headers": response.headers,
+            "offset": offset,
+            "length": len(response.body),
+        }
+        self._index_file.write(json.dumps(entry) + "\n")
+        self._index_file.flush()
+        self._index[url] = entry
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._index_file is not None:
+            self._index_file.close()
+        self._bodies_file.close()
+
+    def _remap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._bodies_file.fileno(), 0, access=mmap.ACCESS_READ)
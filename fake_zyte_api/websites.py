@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+from aiohttp import web
+from aiohttp.client_proto import ResponseHandler
+
+from .registry import load_object
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from aiohttp import ClientRequest, ClientTimeout
+    from aiohttp.tracing import Trace
+
+# Apps of zyte-test-websites, by the host name they are served at when
+# embedded.
+DEFAULT_WEBSITES = {
+    "ecommerce.test": "zyte_test_websites.ecommerce.app:make_app",
+    "jobs.test": "zyte_test_websites.jobs.app:make_app",
+    "articles.test": "zyte_test_websites.articles.app:make_app",
+}
+
+
+class _MemoryTransport(asyncio.Transport):
+    """One end of an in-memory connection: data written to it is received
+    by the protocol of the other end, in a later iteration of the event
+    loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, host: str) -> None:
+        super().__init__({"peername": (host, 0), "sockname": (host, 0)})
+        self._loop = loop
+        self._protocol: asyncio.BaseProtocol | None = None
+        self._peer: _MemoryTransport | None = None
+        self._received: deque[bytes] = deque()
+        self._paused = False
+        self._closing = False
+        self._peer_closed = False
+        self._lost = False
+
+    @classmethod
+    def pair(
+        cls, loop: asyncio.AbstractEventLoop, host: str
+    ) -> tuple[_MemoryTransport, _MemoryTransport]:
+        first, second = cls(loop, host), cls(loop, host)
+        first._peer, second._peer = second, first
+        return first, second
+
+    def get_protocol(self) -> asyncio.BaseProtocol:
+        assert self._protocol is not None
+        return self._protocol
+
+    def set_protocol(self, protocol: asyncio.BaseProtocol) -> None:
+        self._protocol = protocol
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def is_reading(self) -> bool:
+        return not self._paused
+
+    def pause_reading(self) -> None:
+        self._paused = True
+
+    def resume_reading(self) -> None:
+        self._paused = False
+        self._loop.call_soon(self._deliver)
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def write(self, data: bytes | bytearray | memoryview) -> None:
+        if self._closing or not data:
+            return
+        assert self._peer is not None
+        self._peer._received.append(bytes(data))
+        self._loop.call_soon(self._peer._deliver)
+
+    def can_write_eof(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self._received.clear()
+        self._loop.call_soon(self._connection_lost)
+        assert self._peer is not None
+        self._peer._peer_closed = True
+        self._loop.call_soon(self._peer._deliver)
+
+    def abort(self) -> None:
+        self.close()
+
+    def _deliver(self) -> None:
+        assert isinstance(self._protocol, asyncio.Protocol)
+        while self._received and not self._paused and not self._lost:
+            self._protocol.data_received(self._received.popleft())
+        if self._peer_closed and not self._received:
+            # Only after receiving everything sent before the other end closed.
+            self._closing = True
+            self._connection_lost()
+
+    def _connection_lost(self) -> None:
+        if self._lost:
+            return
+        self._lost = True
+        assert self._protocol is not None
+        self._protocol.connection_lost(None)
+
+
+class InMemoryConnector(aiohttp.TCPConnector):
+    """Connector that connects to the *servers* of some host names in
+    memory, without sockets, and to any other host over TCP.
+
+    Keyword arguments are those of :class:`aiohttp.TCPConnector`.
+    """
+
+    def __init__(self, servers: Mapping[str, web.Server], **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._servers = servers
+
+    async def _create_connection(
+        self, req: ClientRequest, traces: list[Trace], timeout: ClientTimeout
+    ) -> ResponseHandler:
+        host = req.url.host or ""
+        server = self._servers.get(host)
+        if server is None:
+            return await super()._create_connection(req, traces, timeout)
+        loop = asyncio.get_running_loop()
+        client_transport, server_transport = _MemoryTransport.pair(loop, host)
+        client_protocol = ResponseHandler(loop)
+        server_protocol = server()
+        client_transport.set_protocol(client_protocol)
+        server_transport.set_protocol(server_protocol)
+        server_protocol.connection_made(server_transport)
+        client_protocol.connection_made(client_transport)
+        return client_protocol
+
+
+class EmbeddedWebsites:
+    """aiohttp applications run in the current process and reached in
+    memory, instead of over the network, through :meth:`connector`.
+
+    *websites* maps host names to applications or to ``"module:function"``
+    paths of functions that return them. It defaults to the apps of
+    ``zyte-test-websites``, see :data:`DEFAULT_WEBSITES`. Requests for any
+    other host go over the network.
+
+    Call :meth:`start` before connecting and :meth:`close` when done.
+    """
+
+    def __init__(
+        self, websites: Mapping[str, web.Application | str] | None = None
+    ) -> None:
+        self._websites = dict(DEFAULT_WEBSITES if websites is None else websites)
+        self._runners: list[web.AppRunner] = []
+        self._servers: dict[str, web.Server] = {}
+
+    @property
+    def hosts(self) -> list[str]:
+        return list(self._websites)
+
+    async def start(self) -> None:
+        for host, website in self._websites.items():
+            app = load_object(website)() if isinstance(website, str) else website
+            runner = web.AppRunner(app, handle_signals=False, access_log=None)
+            await runner.setup()
+            self._runners.append(runner)
+            assert runner.server is not None
+            self._servers[host] = runner.server
+
+    async def close(self) -> None:
+        self._servers.clear()
+        while self._runners:
+            await self._runners.pop().cleanup()
+
+    def connector(self, **kwargs: Any) -> InMemoryConnector:
+        """Return a connector that reaches these websites in memory.
+
+        Keyword arguments are those of :class:`aiohttp.TCPConnector`.
+        """
+        return InMemoryConnector(self._servers, **kwargs)
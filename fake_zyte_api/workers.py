@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import signal
+import time
+from multiprocessing.connection import wait
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from multiprocessing.process import BaseProcess
+
+logger = logging.getLogger(__name__)
+
+
+def run_workers(
+    target: Callable[..., None],
+    args: tuple[Any, ...],
+    *,
+    workers: int,
+    restart_delay: float = 1.0,
+    shutdown_timeout: float = 10.0,
+) -> None:
+    """Run *target* with *args* in *workers* processes until interrupted.
+
+    *target* must be picklable, and it is expected to serve on a port shared
+    by all workers through ``SO_REUSEPORT``.
+
+    Workers that exit are restarted, after *restart_delay* seconds if they
+    exited less than *restart_delay* seconds after starting, to avoid a
+    restart loop. On SIGINT or SIGTERM, workers get SIGTERM, and those still
+    running after *shutdown_timeout* seconds are killed.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes: dict[int, tuple[float, BaseProcess]] = {}
+
+    def start(index: int) -> None:
+        process = context.Process(
+            target=target, args=args, name=f"fake-zyte-api-worker-{index}"
+        )
+        process.start()
+        processes[index] = (time.monotonic(), process)
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for index in range(workers):
+            start(index)
+        while True:
+            wait([process.sentinel for _, process in processes.values()])
+            for index, (started_at, process) in list(processes.items()):
+                if process.exitcode is None:
+                    continue
+                logger.warning(
+                    "Worker %s exited with code %s, restarting it",
+                    process.pid,
+                    process.exitcode,
+                )
+                if time.monotonic() - started_at < restart_delay:
+                    time.sleep(restart_delay)
+                start(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + shutdown_timeout
+        for _, process in processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
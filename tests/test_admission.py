@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from fake_zyte_api.admission import AdmissionControl
+from fake_zyte_api.api import RequestError
+
+
+async def hold(
+    admission_control: AdmissionControl, url: str, event: asyncio.Event
+) -> None:
+    async with admission_control.admit(url):
+        await event.wait()
+
+
+async def test_global_limit():
+    admission_control = AdmissionControl(max_concurrency=1, max_queue=1)
+    event = asyncio.Event()
+    tasks = [
+        asyncio.ensure_future(hold(admission_control, "https://a.example", event))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    with pytest.raises(RequestError) as exc_info:
+        async with admission_control.admit("https://b.example"):
+            pass
+    assert exc_info.value.status == 503
+    assert exc_info.value.type == "/limits/over-global-limit"
+    event.set()
+    await asyncio.gather(*tasks)
+    async with admission_control.admit("https://b.example"):
+        pass
+
+
+async def test_host_limit():
+    admission_control = AdmissionControl(max_concurrency_per_host=1)
+    event = asyncio.Event()
+    task = asyncio.ensure_future(hold(admission_control, "https://a.example/1", event))
+    await asyncio.sleep(0)
+    with pytest.raises(RequestError) as exc_info:
+        async with admission_control.admit("https://a.example/2"):
+            pass
+    assert exc_info.value.status == 429
+    assert exc_info.value.type == "/limits/over-domain-limit"
+    async with admission_control.admit("https://b.example"):
+        pass
+    event.set()
+    await task
+    assert not admission_control._host_limits
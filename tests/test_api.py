@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from base64 import b64encode
+
+import pytest
+
+from fake_zyte_api.api import _Base64Encoder, can_stream
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        [],
+        [b"a"],
+        [b"abc"],
+        [b"a", b"b", b"c", b"d"],
+        [b"ab", b"", b"cdefg", b"h"],
+        [b"abcd", b"e", b"fghijklmnop"],
+    ],
+)
+def test_base64_encoder(chunks):
+    encoder = _Base64Encoder()
+    encoded = b"".join(
+        encoded_chunk for chunk in chunks for encoded_chunk in encoder.encode(chunk)
+    )
+    encoded += encoder.flush()
+    assert encoded == b64encode(b"".join(chunks))
+
+
+def test_can_stream():
+    assert can_stream({"url": "a", "httpResponseBody": True})
+    assert can_stream(
+        {"url": "a", "httpResponseBody": True, "httpResponseHeaders": True}
+    )
+    assert not can_stream({"url": "a", "httpResponseHeaders": True})
+    assert not can_stream({"url": "a", "httpResponseBody": True, "product": True})
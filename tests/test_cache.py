@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import sqlite3
+
+from fake_zyte_api import cache
+from fake_zyte_api.cache import LRUCache, SharedCache, remove_shared_cache
+
+
+def test_lru_eviction():
+    lru: LRUCache[str, bytes] = LRUCache(max_size=10, sizeof=len)
+    lru.set("a", b"1234")
+    lru.set("b", b"1234")
+    assert lru.get("a") == b"1234"
+    lru.set("c", b"1234")
+    assert lru.size == 8
+    assert lru.get("b") is None
+    assert lru.get("a") == b"1234"
+    assert lru.get("c") == b"1234"
+    assert (lru.hits, lru.misses) == (3, 1)
+
+
+def test_oversized_value():
+    lru: LRUCache[str, bytes] = LRUCache(max_size=3, sizeof=len)
+    lru.set("a", b"1234")
+    assert len(lru) == 0
+    assert lru.size == 0
+
+
+def test_replace_value():
+    lru: LRUCache[str, bytes] = LRUCache(max_size=10, sizeof=len)
+    lru.set("a", b"1234")
+    lru.set("a", b"12")
+    assert lru.size == 2
+    assert lru.get("a") == b"12"
+
+
+def test_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(cache, "monotonic", lambda: now)
+    lru: LRUCache[str, int] = LRUCache(max_size=10, ttl=5)
+    lru.set("a", 1)
+    now += 5
+    assert lru.get("a") == 1
+    now += 1
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+async def test_shared_cache(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    first = SharedCache(path, max_size=10)
+    second = SharedCache(path, max_size=10)
+    await first.set("a", b"1234")
+    await second.set("b", b"1234")
+    assert await first.get("b") == b"1234"
+    assert await second.get("a") == b"1234"
+    await first.set("c", b"1234")
+    assert await second.get("a") is None
+    assert await second.count() == 2
+    assert len(second) == 2
+    assert (second.hits, second.misses) == (1, 1)
+    await second.set("b", b"12")
+    assert await first.get("b") == b"12"
+    await second.set("d", b"12345678901")
+    assert await first.get("d") is None
+    await first.clear()
+    assert await second.count() == 0
+    first.close()
+    second.close()
+    remove_shared_cache(path)
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_shared_cache_ttl(monkeypatch, tmp_path):
+    now = 1000.0
+    monkeypatch.setattr(cache, "time", lambda: now)
+    shared_cache = SharedCache(tmp_path / "cache.sqlite3", ttl=5)
+    await shared_cache.set("a", b"1")
+    now += 5
+    assert await shared_cache.get("a") == b"1"
+    now += 1
+    assert await shared_cache.get("a") is None
+    shared_cache.close()
+
+
+async def test_shared_cache_errors(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    shared_cache = SharedCache(path)
+    other = sqlite3.connect(path, isolation_level=None)
+    # Another process holding the write lock.
+    other.execute("BEGIN IMMEDIATE")
+    await shared_cache.set("a", b"1")
+    other.rollback()
+    assert await shared_cache.get("a") is None
+    # A broken database.
+    other.execute("DROP TABLE entries")
+    other.close()
+    await shared_cache.set("a", b"1")
+    assert await shared_cache.get("a") is None
+    assert (shared_cache.hits, shared_cache.misses) == (0, 2)
+    assert await shared_cache.count() == 0
+    await shared_cache.clear()
+    shared_cache.close()
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pytest
+
+from fake_zyte_api.api import RequestError, make_item_cache
+from fake_zyte_api.client import InProcessZyteAPI
+from fake_zyte_api.main import make_app
+
+
+async def test_get(fake_zyte_api_client, jobs_website):
+    url = str(jobs_website.make_url("/jobs/4"))
+    response_data = await fake_zyte_api_client.get(
+        {"url": url, "httpResponseBody": True, "jobPostingNavigation": True}
+    )
+    assert response_data["url"] == url
+    assert response_data["statusCode"] == 200
+    assert "httpResponseBody" in response_data
+    assert "jobPostingNavigation" in response_data
+
+
+async def test_iter(fake_zyte_api_client, jobs_website):
+    urls = {str(jobs_website.make_url(f"/jobs/{i}")) for i in range(1, 4)}
+    queries = [{"url": url, "httpResponseBody": True} for url in urls]
+    response_urls = set()
+    for future in fake_zyte_api_client.iter(queries):
+        response_data = await future
+        response_urls.add(response_data["url"])
+    assert response_urls == urls
+
+
+async def test_iter_same_query(fake_zyte_api_client, jobs_website):
+    query = {
+        "url": str(jobs_website.make_url("/jobs/4")),
+        "jobPostingNavigation": True,
+    }
+    responses = [await future for future in fake_zyte_api_client.iter([query, query])]
+    assert responses[0] == responses[1]
+    responses[0]["jobPostingNavigation"].clear()
+    assert responses[1]["jobPostingNavigation"]
+
+
+async def test_missing_url(fake_zyte_api_client):
+    with pytest.raises(RequestError) as exc_info:
+        await fake_zyte_api_client.get({"httpResponseBody": True})
+    assert exc_info.value.status == 400
+
+
+async def test_unsupported_endpoint(fake_zyte_api_client):
+    with pytest.raises(ValueError, match="Unsupported endpoint"):
+        await fake_zyte_api_client.get({"url": "https://a.example"}, endpoint="x")
+
+
+async def test_item_cache(jobs_website):
+    client = InProcessZyteAPI(make_app(item_cache=make_item_cache(max_size=16)))
+    await client.start()
+    try:
+        query = {
+            "url": str(jobs_website.make_url("/jobs/4")),
+            "jobPostingNavigation": True,
+        }
+        response_data = await client.get(query)
+        expected = dict(response_data["jobPostingNavigation"])
+        response_data["jobPostingNavigation"].clear()
+        response_data = await client.get(query)
+        assert response_data["jobPostingNavigation"] == expected
+    finally:
+        await client.close()
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from fake_zyte_api.coalesce import SingleFlight
+
+
+async def test_coalesce():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def func() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(single_flight.run("a", func) for _ in range(5)))
+    assert results == [1] * 5
+    assert calls == 1
+    assert len(single_flight) == 0
+
+    assert await single_flight.run("a", func) == 2
+
+
+async def test_different_keys():
+    single_flight = SingleFlight()
+
+    async def func(value: int) -> int:
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(
+        single_flight.run("a", lambda: func(1)),
+        single_flight.run("b", lambda: func(2)),
+    )
+    assert list(results) == [1, 2]
+
+
+async def test_error_propagation():
+    single_flight = SingleFlight()
+
+    async def func() -> None:
+        await asyncio.sleep(0.01)
+        raise ValueError("foo")
+
+    results = await asyncio.gather(
+        *(single_flight.run("a", func) for _ in range(3)), return_exceptions=True
+    )
+    assert len(results) == 3
+    for result in results:
+        assert isinstance(result, ValueError)
+    assert len(single_flight) == 0
+
+
+async def test_waiter_cancellation():
+    single_flight = SingleFlight()
+    event = asyncio.Event()
+
+    async def func() -> str:
+        await event.wait()
+        return "done"
+
+    first = asyncio.create_task(single_flight.run("a", func))
+    second = asyncio.create_task(single_flight.run("a", func))
+    await asyncio.sleep(0)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    event.set()
+    assert await second == "done"
+
+
+async def test_all_waiters_cancelled():
+    single_flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def func() -> None:
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.create_task(single_flight.run("a", func))
+    await started.wait()
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert len(single_flight) == 0
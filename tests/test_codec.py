@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import pytest
+
+from fake_zyte_api.codec import JSON_CODEC_NAMES, STDLIB_JSON_CODEC, get_json_codec
+from fake_zyte_api.main import make_app
+
+
+@pytest.mark.parametrize("name", JSON_CODEC_NAMES)
+def test_round_trip(name):
+    pytest.importorskip(name)
+    codec = get_json_codec(name)
+    assert codec.name == name
+    data = {"url": "https://example.com/", "name": "Bogotá", "items": [1, 2.5, None]}
+    encoded = codec.dumps(data)
+    assert isinstance(encoded, bytes)
+    assert codec.loads(encoded) == data
+    assert STDLIB_JSON_CODEC.loads(encoded) == data
+
+
+def test_default():
+    assert get_json_codec().name in JSON_CODEC_NAMES
+
+
+def test_unknown():
+    with pytest.raises(ValueError, match="Unknown JSON codec"):
+        get_json_codec("foo")
+
+
+@pytest.mark.parametrize("name", JSON_CODEC_NAMES)
+async def test_app(aiohttp_client, jobs_website, name):
+    pytest.importorskip(name)
+    api_client = await aiohttp_client(make_app(json_codec=get_json_codec(name)))
+    url = str(jobs_website.make_url("/job/1888448280485890"))
+    response = await api_client.post("/extract", json={"url": url, "jobPosting": True})
+    assert response.status == 200
+    assert response.content_type == "application/json"
+    response_data = await response.json()
+    assert response_data["jobPosting"]["jobTitle"] == "Litigation Attorney"
+
+    response = await api_client.post("/extract", data="{")
+    assert response.status == 400
+    response_data = await response.json(content_type=None)
+    assert response_data["type"] == "/request/invalid"
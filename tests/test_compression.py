@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+from aiohttp import web
+
+from fake_zyte_api.compression import Compression, is_available
+from fake_zyte_api.main import make_app
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("deflate, gzip;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("*", "gzip"),
+        ("*, gzip;q=0", None),
+        ("GZIP ; q=0.8", "gzip"),
+        ("gzip;q=foo", None),
+    ],
+)
+def test_negotiate(accept_encoding, expected):
+    compression = Compression(codings=["gzip"])
+    assert compression.negotiate(accept_encoding) == expected
+
+
+def test_negotiate_preference():
+    if not is_available("br"):
+        pytest.skip("brotli is not installed")
+    compression = Compression(codings=["br", "gzip"])
+    assert compression.negotiate("gzip, br") == "br"
+    assert compression.negotiate("gzip, br;q=0.9") == "gzip"
+
+
+@pytest.mark.parametrize("coding", ["zstd", "br", "gzip"])
+def test_compressor(coding):
+    if not is_available(coding):
+        pytest.skip(f"{coding} is not installed")
+    compression = Compression(codings=[coding])
+    data = b'{"httpResponseBody": "PGh0bWw+"}' * 1000
+    compressor = compression.compressor(coding)
+    compressed = compressor.compress(data[:100]) + compressor.compress(data[100:])
+    compressed += compressor.flush()
+    assert len(compressed) < len(data) / 10
+    if coding == "gzip":
+        assert gzip.decompress(compressed) == data
+        assert gzip.decompress(compression.compress(data, coding)) == data
+
+        compressor = compression.compressor(coding)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        compressed = compressor.compress(data[:100]) + compressor.sync_flush()
+        assert decompressor.decompress(compressed) == data[:100]
+
+
+def test_invalid():
+    with pytest.raises(ValueError, match="Unknown content coding"):
+        Compression(codings=["foo"])
+    with pytest.raises(ValueError, match="Unknown content coding"):
+        Compression(levels={"foo": 1})
+
+
+async def test_responses(aiohttp_client, jobs_website):
+    client = await aiohttp_client(
+        make_app(compression=Compression(codings=["gzip"], min_size=100))
+    )
+    url = str(jobs_website.make_url("/jobs/4"))
+    for request_data in (
+        {"url": url, "httpResponseBody": True},
+        {"url": url, "browserHtml": True},
+    ):
+        response = await client.post(
+            "/extract", json=request_data, headers={"Accept-Encoding": "gzip"}
+        )
+        assert response.status == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert (await response.json())["url"] == url
+
+        response = await client.post(
+            "/extract", json=request_data, headers={"Accept-Encoding": "identity"}
+        )
+        assert response.status == 200
+        assert "Content-Encoding" not in response.headers
+        assert (await response.json())["url"] == url
+
+    # Smaller than min_size.
+    response = await client.post(
+        "/extract", json={}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status == 400
+    assert "Content-Encoding" not in response.headers
+
+
+async def test_batch(aiohttp_client, jobs_website):
+    client = await aiohttp_client(make_app(compression=Compression(codings=["gzip"])))
+    urls = [str(jobs_website.make_url(f"/jobs/{i}")) for i in range(1, 4)]
+    body = "\n".join(json.dumps({"url": url, "httpResponseBody": True}) for url in urls)
+    response = await client.post(
+        "/extract/batch",
+        data=gzip.compress(body.encode()),
+        headers={"Content-Encoding": "gzip", "Accept-Encoding": "gzip"},
+    )
+    assert response.status == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    results = [json.loads(line) for line in (await response.text()).splitlines()]
+    assert sorted(result["url"] for result in results) == sorted(urls)
+
+
+async def test_batch_streamed(aiohttp_client, aiohttp_server):
+    release = asyncio.Event()
+
+    async def page(request: web.Request) -> web.Response:
+        if request.match_info["name"] == "slow":
+            await release.wait()
+        return web.Response(text=request.match_info["name"])
+
+    website_app = web.Application()
+    website_app.router.add_get("/{name}", page)
+    website = await aiohttp_server(website_app)
+    client = await aiohttp_client(
+        make_app(compression=Compression(codings=["gzip"])), auto_decompress=False
+    )
+    batch = [
+        {"url": str(website.make_url(f"/{name}")), "httpResponseBody": True}
+        for name in ("slow", "fast")
+    ]
+    response = await client.post(
+        "/extract/batch", json=batch, headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    text = b""
+    try:
+        while b"\n" not in text:
+            chunk = await asyncio.wait_for(response.content.readany(), 5)
+            assert chunk
+            text += decompressor.decompress(chunk)
+    finally:
+        release.set()
+    assert json.loads(text.splitlines()[0])["url"] == batch[1]["url"]
+    text += decompressor.decompress(await response.read())
+    assert len(text.splitlines()) == 2
@@ -1,8 +1,25 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
+import sqlite3
 from base64 import b64decode
 from typing import TYPE_CHECKING, Any
 
+import aiohttp
+import parsel
+import pytest
+from aiohttp import web
+from web_poet import WebPage
+
+from fake_zyte_api.api import handle_request, make_item_cache, make_response_cache
+from fake_zyte_api.cache import SharedCache
+from fake_zyte_api.main import CLIENT_SESSION_KEY, make_app, make_executor
+from fake_zyte_api.metrics import Metrics
+from fake_zyte_api.registry import make_default_registry
+from fake_zyte_api.simulation import Simulation
+
 if TYPE_CHECKING:
     from aiohttp import ClientResponse
     from aiohttp.test_utils import TestClient
@@ -136,3 +153,495 @@ async def test_extraction_without_body(api_client, jobs_website):
     assert "jobPosting" in response_data
     job_posting = response_data["jobPosting"]
     assert job_posting["jobTitle"] == "Litigation Attorney"
+
+
+async def test_shared_session(aiohttp_client, jobs_website):
+    api_client = await aiohttp_client(make_app(limit=10, limit_per_host=2))
+    session = api_client.app[CLIENT_SESSION_KEY]
+    assert session.connector is not None
+    assert session.connector.limit == 10
+    assert session.connector.limit_per_host == 2
+
+    url = str(jobs_website.make_url("/jobs/4"))
+    for _ in range(3):
+        response = await get_api_response(api_client, {"url": url})
+        assert response.status == 200
+    assert api_client.app[CLIENT_SESSION_KEY] is session
+    assert not session.closed
+
+
+async def test_handle_request_without_session(jobs_website):
+    url = str(jobs_website.make_url("/jobs/4"))
+    response_data = await handle_request({"url": url, "browserHtml": True})
+    assert response_data["statusCode"] == 200
+    assert "<h1>109 jobs in Energy:</h1>" in response_data["browserHtml"]
+
+
+async def test_response_cache(aiohttp_client, jobs_website):
+    response_cache = make_response_cache()
+    api_client = await aiohttp_client(make_app(response_cache=response_cache))
+    url = str(jobs_website.make_url("/jobs/4"))
+    for _ in range(3):
+        response = await get_api_response(
+            api_client, {"url": url, "httpResponseBody": True}
+        )
+        assert response.status == 200
+        response_data = await response.json()
+        text = b64decode(response_data["httpResponseBody"]).decode("utf-8")
+        assert "<h1>109 jobs in Energy:</h1>" in text
+    assert len(response_cache) == 1
+    assert (response_cache.hits, response_cache.misses) == (2, 1)
+
+
+async def test_concurrent_requests(api_client, jobs_website):
+    url = str(jobs_website.make_url("/job/1888448280485890"))
+    responses = await asyncio.gather(
+        *(
+            get_api_response(api_client, {"url": url, "jobPosting": True})
+            for _ in range(5)
+        )
+    )
+    for response in responses:
+        assert response.status == 200
+        response_data = await response.json()
+        assert response_data["jobPosting"]["jobTitle"] == "Litigation Attorney"
+
+
+async def test_item_cache(aiohttp_client, jobs_website):
+    item_cache = make_item_cache()
+    api_client = await aiohttp_client(make_app(item_cache=item_cache))
+    url = str(jobs_website.make_url("/job/1888448280485890"))
+    job_postings = []
+    for _ in range(2):
+        response = await get_api_response(api_client, {"url": url, "jobPosting": True})
+        assert response.status == 200
+        response_data = await response.json()
+        job_postings.append(response_data["jobPosting"])
+    assert len(item_cache) == 1
+    assert (item_cache.hits, item_cache.misses) == (1, 1)
+    assert job_postings[1]["jobTitle"] == "Litigation Attorney"
+    assert job_postings[1]["metadata"]["dateDownloaded"].endswith("Z")
+    for job_posting in job_postings:
+        del job_posting["metadata"]["dateDownloaded"]
+    assert job_postings[0] == job_postings[1]
+
+
+async def test_shared_cache(aiohttp_client, aiohttp_server, tmp_path):
+    fetches = 0
+
+    async def job(request: web.Request) -> web.Response:
+        nonlocal fetches
+        fetches += 1
+        return web.Response(
+            text="<h1>Litigation Attorney</h1>", content_type="text/html"
+        )
+
+    website_app = web.Application()
+    website_app.router.add_get("/job/1", job)
+    website = await aiohttp_server(website_app)
+    url = str(website.make_url("/job/1"))
+    request_data = {"url": url, "httpResponseBody": True, "jobPosting": True}
+    # Each app stands for a worker process, with its own connection.
+    shared_caches = [SharedCache(tmp_path / "cache.sqlite3") for _ in range(2)]
+    results = []
+    for shared_cache in shared_caches:
+        api_client = await aiohttp_client(make_app(shared_cache=shared_cache))
+        response = await get_api_response(api_client, request_data)
+        assert response.status == 200
+        results.append(await response.json())
+    assert fetches == 1
+    assert (shared_caches[1].hits, shared_caches[1].misses) == (2, 0)
+    assert await shared_caches[1].count() == 2
+    for result in results:
+        del result["jobPosting"]["metadata"]["dateDownloaded"]
+    assert results[0] == results[1]
+    for shared_cache in shared_caches:
+        shared_cache.close()
+
+
+async def test_multiple_items(api_client, ecommerce_website):
+    url = str(ecommerce_website.make_url("/category/11"))
+    response = await get_api_response(
+        api_client,
+        {
+            "url": url,
+            "productList": True,
+            "productNavigation": True,
+        },
+    )
+    assert response.status == 200
+    response_data = await response.json()
+    assert response_data["productList"]["categoryName"] == "Children's"
+    assert response_data["productNavigation"]["categoryName"] == "Children's"
+
+
+async def test_shared_selector(api_client, ecommerce_website, monkeypatch):
+    # Relies on a private attribute of web-poet, which could be renamed.
+    parses = 0
+
+    class CountingSelector(parsel.Selector):
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            nonlocal parses
+            if kwargs.get("text") is not None:
+                parses += 1
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(parsel, "Selector", CountingSelector)
+    url = str(ecommerce_website.make_url("/category/11"))
+    response = await get_api_response(
+        api_client, {"url": url, "productList": True, "productNavigation": True}
+    )
+    assert response.status == 200
+    assert parses == 1
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+async def test_executor(aiohttp_client, ecommerce_website, kind):
+    executor = make_executor(kind, 1)
+    try:
+        api_client = await aiohttp_client(make_app(executor=executor))
+        url = str(ecommerce_website.make_url("/category/11"))
+        response = await get_api_response(
+            api_client,
+            {
+                "url": url,
+                "httpResponseBody": True,
+                "productList": True,
+                "productNavigation": True,
+            },
+        )
+        assert response.status == 200
+        response_data = await response.json()
+        assert "httpResponseBody" in response_data
+        assert response_data["productList"]["categoryName"] == "Children's"
+        assert response_data["productNavigation"]["categoryName"] == "Children's"
+    finally:
+        executor.shutdown()
+
+
+async def test_batch(api_client, jobs_website):
+    urls = [str(jobs_website.make_url(f"/job/{i}")) for i in range(5)]
+    batch = [{"url": url, "jobPosting": True} for url in urls]
+    for body in (
+        json.dumps(batch),
+        "\n".join(json.dumps(request_data) for request_data in batch),
+    ):
+        response = await api_client.post("/extract/batch", data=body)
+        assert response.status == 200
+        assert response.content_type == "application/x-ndjson"
+        lines = (await response.text()).splitlines()
+        results = [json.loads(line) for line in lines]
+        assert sorted(result["url"] for result in results) == sorted(urls)
+        for result in results:
+            assert result["statusCode"] == 200
+            assert "jobPosting" in result
+
+
+async def test_batch_disconnect(aiohttp_client, aiohttp_server):
+    fetches = 0
+
+    async def slow(request: web.Request) -> web.Response:
+        nonlocal fetches
+        fetches += 1
+        await asyncio.sleep(0.1)
+        return web.Response(text="slow")
+
+    website_app = web.Application()
+    website_app.router.add_get("/{index}", slow)
+    website = await aiohttp_server(website_app)
+    api_client = await aiohttp_client(make_app(batch_concurrency=2))
+    batch = [
+        {"url": str(website.make_url(f"/{index}")), "browserHtml": True}
+        for index in range(20)
+    ]
+    response = await api_client.post("/extract/batch", json=batch)
+    assert json.loads(await response.content.readline())["statusCode"] == 200
+    response.close()
+    await asyncio.sleep(1.5)
+    assert fetches < 10
+
+
+async def test_batch_errors(api_client):
+    response = await api_client.post("/extract/batch", data="[{")
+    assert response.status == 400
+    assert (await response.json())["type"] == "/request/invalid"
+
+    response = await api_client.post("/extract/batch", json=[{"foo": "bar"}])
+    assert response.status == 200
+    results = [json.loads(line) for line in (await response.text()).splitlines()]
+    assert results == [
+        {
+            "type": "/request/invalid",
+            "title": "Invalid Request",
+            "status": 400,
+            "detail": "Missing url.",
+        }
+    ]
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+async def test_streaming(aiohttp_client, jobs_website, streaming):
+    metrics = Metrics()
+    api_client = await aiohttp_client(make_app(streaming=streaming, metrics=metrics))
+    url = str(jobs_website.make_url("/jobs/4"))
+    response = await get_api_response(
+        api_client,
+        {"url": url, "httpResponseBody": True, "httpResponseHeaders": True},
+    )
+    assert response.status == 200
+    assert response.content_type == "application/json"
+    response_data = await response.json()
+    assert response_data["url"] == url
+    assert response_data["statusCode"] == 200
+    assert any(
+        header["name"] == "Content-Type"
+        for header in response_data["httpResponseHeaders"]
+    )
+    text = b64decode(response_data["httpResponseBody"]).decode("utf-8")
+    assert "<h1>109 jobs in Energy:</h1>" in text
+    assert metrics.upstream_responses == {200: 1}
+    assert metrics.upstream_requests_in_flight == 0
+    for stage in ("fetch", "base64"):
+        assert metrics.stage_durations[stage].count == 1
+
+
+@pytest.mark.parametrize("output", ["httpResponseBody", "browserHtml"])
+async def test_max_body_size(aiohttp_client, jobs_website, output):
+    api_client = await aiohttp_client(make_app(max_body_size=10))
+    url = str(jobs_website.make_url("/jobs/4"))
+    response = await get_api_response(api_client, {"url": url, output: True})
+    assert response.status == 521
+    response_data = await response.json()
+    assert response_data["type"] == "/download/internal-error"
+
+
+async def test_max_body_size_chunked(aiohttp_client, aiohttp_server, caplog):
+    async def chunked(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for _ in range(10):
+            await response.write(b"x" * 100)
+            await asyncio.sleep(0.01)
+        await response.write_eof()
+        return response
+
+    website_app = web.Application()
+    website_app.router.add_get("/", chunked)
+    website = await aiohttp_server(website_app)
+    metrics = Metrics()
+    api_client = await aiohttp_client(make_app(max_body_size=300, metrics=metrics))
+    response = await get_api_response(
+        api_client, {"url": str(website.make_url("/")), "httpResponseBody": True}
+    )
+    # The body size is only known to be too big once streaming has started.
+    assert response.status == 200
+    with pytest.raises(aiohttp.ClientPayloadError):
+        await asyncio.wait_for(response.read(), 5)
+    assert metrics.responses == {200: 1}
+    assert all(record.levelno < logging.ERROR for record in caplog.records)
+
+
+async def test_stalled_stream(aiohttp_client, aiohttp_server, caplog):
+    release = asyncio.Event()
+
+    async def stalling(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(b"x" * 100)
+        await release.wait()
+        return response
+
+    website_app = web.Application()
+    website_app.router.add_get("/", stalling)
+    website = await aiohttp_server(website_app)
+    metrics = Metrics()
+    api_client = await aiohttp_client(
+        make_app(timeout=aiohttp.ClientTimeout(sock_read=0.2), metrics=metrics)
+    )
+    try:
+        response = await get_api_response(
+            api_client, {"url": str(website.make_url("/")), "httpResponseBody": True}
+        )
+        assert response.status == 200
+        with pytest.raises(aiohttp.ClientPayloadError):
+            await asyncio.wait_for(response.read(), 5)
+    finally:
+        release.set()
+    assert metrics.responses == {200: 1}
+    assert all(record.levelno < logging.ERROR for record in caplog.records)
+
+
+async def test_metrics(aiohttp_client, jobs_website):
+    metrics = Metrics()
+    api_client = await aiohttp_client(make_app(metrics=metrics))
+    url = str(jobs_website.make_url("/job/1888448280485890"))
+    request_data = {"url": url, "browserHtml": True, "jobPosting": True}
+    response = await get_api_response(api_client, request_data)
+    assert response.status == 200
+    assert metrics.responses == {200: 1}
+    assert metrics.upstream_responses == {200: 1}
+    assert metrics.items == {"jobPosting": 1}
+    assert metrics.requests_in_flight == 0
+    for stage in ("request", "fetch", "decode", "extraction", "serialization"):
+        assert metrics.stage_durations[stage].count == 1
+
+    response = await api_client.get("/metrics")
+    assert response.status == 200
+    assert response.content_type == "text/plain"
+    text = await response.text()
+    assert 'fake_zyte_api_items_total{type="jobPosting"} 1' in text.splitlines()
+
+
+async def test_metrics_shared_cache(aiohttp_client, jobs_website, tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    shared_cache = SharedCache(path)
+    api_client = await aiohttp_client(
+        make_app(metrics=Metrics(), shared_cache=shared_cache)
+    )
+    url = str(jobs_website.make_url("/jobs/4"))
+    response = await get_api_response(api_client, {"url": url, "browserHtml": True})
+    assert response.status == 200
+    response = await api_client.get("/metrics")
+    text = await response.text()
+    assert 'fake_zyte_api_cache_entries{cache="shared"} 1' in text.splitlines()
+
+    # A broken shared cache does not break metrics.
+    connection = sqlite3.connect(path)
+    connection.execute("DROP TABLE entries")
+    connection.close()
+    response = await api_client.get("/metrics")
+    assert response.status == 200
+    text = await response.text()
+    assert 'fake_zyte_api_cache_entries{cache="shared"} 0' in text.splitlines()
+    shared_cache.close()
+
+
+async def test_metrics_disabled(api_client):
+    response = await api_client.get("/metrics")
+    assert response.status == 404
+
+
+async def test_admission_control(aiohttp_client, aiohttp_server):
+    entered = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow(request: Request) -> web.Response:
+        entered.set()
+        await release.wait()
+        return web.Response(text="ok")
+
+    website_app = web.Application()
+    website_app.router.add_get("/", slow)
+    website = await aiohttp_server(website_app)
+    url = str(website.make_url("/"))
+    api_client = await aiohttp_client(make_app(max_concurrency=1))
+    request_data = {"url": url, "httpResponseBody": True}
+    first_response = asyncio.ensure_future(get_api_response(api_client, request_data))
+    await entered.wait()
+
+    response = await get_api_response(api_client, request_data)
+    assert response.status == 503
+    assert (await response.json())["type"] == "/limits/over-global-limit"
+    response = await api_client.post("/extract/batch", json=[request_data])
+    result = json.loads(await response.read())
+    assert result["status"] == 503
+
+    release.set()
+    response = await first_response
+    assert response.status == 200
+
+
+async def test_connection_error(aiohttp_client, unused_tcp_port):
+    api_client = await aiohttp_client(make_app(retries=1, retry_backoff=0))
+    url = f"http://127.0.0.1:{unused_tcp_port}/"
+    for output in ("browserHtml", "httpResponseBody"):
+        response = await get_api_response(api_client, {"url": url, output: True})
+        assert response.status == 520
+        response_data = await response.json()
+        assert response_data["type"] == "/download/temporary-error"
+
+
+async def test_timeout(aiohttp_client, aiohttp_server):
+    async def slow(request: Request) -> web.Response:
+        await asyncio.sleep(10)
+        return web.Response(text="ok")
+
+    website_app = web.Application()
+    website_app.router.add_get("/", slow)
+    website = await aiohttp_server(website_app)
+    app = make_app(timeout=aiohttp.ClientTimeout(total=0.1))
+    api_client = await aiohttp_client(app)
+    url = str(website.make_url("/"))
+    response = await get_api_response(api_client, {"url": url, "browserHtml": True})
+    assert response.status == 520
+
+
+async def test_retries(aiohttp_client, aiohttp_server):
+    calls = 0
+
+    async def flaky(request: Request) -> web.Response:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            assert request.transport is not None
+            request.transport.close()
+        return web.Response(text="ok")
+
+    website_app = web.Application()
+    website_app.router.add_get("/", flaky)
+    website = await aiohttp_server(website_app)
+    api_client = await aiohttp_client(make_app(retries=1, retry_backoff=0))
+    url = str(website.make_url("/"))
+    response = await get_api_response(api_client, {"url": url, "browserHtml": True})
+    assert response.status == 200
+    assert (await response.json())["browserHtml"] == "ok"
+    assert calls == 2
+
+
+async def test_invalid_url(api_client):
+    response = await get_api_response(api_client, {"url": "foo", "browserHtml": True})
+    assert response.status == 400
+
+
+async def test_simulation(aiohttp_client, jobs_website):
+    simulation = Simulation(error_rates={520: 1})
+    api_client = await aiohttp_client(make_app(simulation=simulation))
+    url = str(jobs_website.make_url("/jobs/4"))
+    response = await get_api_response(api_client, {"url": url, "browserHtml": True})
+    assert response.status == 520
+    assert (await response.json())["title"] == "Temporary Downloading Error"
+
+
+class TitlePage(WebPage[Any]):
+    async def to_item(self) -> dict[str, Any]:
+        return {"title": self.css("title::text").get()}
+
+
+async def test_page_registry(aiohttp_client, jobs_website):
+    page_registry = make_default_registry()
+    page_registry.register(
+        "jobPosting", TitlePage, urls=[str(jobs_website.make_url("/jobs/*"))]
+    )
+    api_client = await aiohttp_client(make_app(page_registry=page_registry))
+    url = str(jobs_website.make_url("/jobs/4"))
+    response = await get_api_response(api_client, {"url": url, "jobPosting": True})
+    assert response.status == 200
+    assert set((await response.json())["jobPosting"]) == {"title"}
+
+
+async def test_browser_html_encoding(aiohttp_client, aiohttp_server):
+    async def latin1(request: Request) -> web.Response:
+        return web.Response(
+            body="<p>Café</p>".encode("latin-1"),
+            content_type="text/html",
+            charset="iso-8859-1",
+        )
+
+    website_app = web.Application()
+    website_app.router.add_get("/", latin1)
+    website = await aiohttp_server(website_app)
+    api_client = await aiohttp_client(make_app())
+    url = str(website.make_url("/"))
+    response = await get_api_response(api_client, {"url": url, "browserHtml": True})
+    assert response.status == 200
+    assert (await response.json())["browserHtml"] == "<p>Café</p>"
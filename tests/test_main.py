@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from contextlib import suppress
+
+import aiohttp
+import pytest
+
+from fake_zyte_api.main import make_executor, parse_args
+
+
+def test_parse_args_port():
+    args = parse_args(["8899"])
+    assert args.port == 8899
+    assert not args.cache
+
+
+def test_parse_args_cache():
+    args = parse_args(["8899", "--cache", "--cache-size", "8", "--cache-ttl", "60"])
+    assert args.cache
+    assert args.cache_size == 8
+    assert args.cache_ttl == 60
+
+
+def test_parse_args_item_cache():
+    args = parse_args(["8899", "--item-cache", "--item-cache-size", "10"])
+    assert args.item_cache
+    assert args.item_cache_size == 10
+
+
+def test_parse_args_executor():
+    args = parse_args(["8899", "--executor", "process", "--executor-workers", "4"])
+    assert args.executor == "process"
+    assert args.executor_workers == 4
+
+
+def test_make_executor_unknown():
+    with pytest.raises(ValueError, match="Unknown executor kind"):
+        make_executor("foo")
+
+
+def test_parse_args_workers():
+    assert parse_args(["8899"]).workers == 1
+    assert parse_args(["8899", "--workers", "4"]).workers == 4
+
+
+async def test_workers(jobs_website, unused_tcp_port):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "fake_zyte_api.main",
+        str(unused_tcp_port),
+        "--workers",
+        "2",
+    )
+    try:
+        api_url = f"http://127.0.0.1:{unused_tcp_port}/extract"
+        url = str(jobs_website.make_url("/jobs/4"))
+        for _ in range(200):
+            with suppress(OSError):
+                _, writer = await asyncio.open_connection("127.0.0.1", unused_tcp_port)
+                writer.close()
+                break
+            await asyncio.sleep(0.1)
+        request_data = {"url": url, "browserHtml": True}
+        async with aiohttp.ClientSession() as session:
+            response = await session.post(api_url, json=request_data)
+            response_data = await response.json()
+        assert "<h1>109 jobs in Energy:</h1>" in response_data["browserHtml"]
+    finally:
+        process.terminate()
+        assert await asyncio.wait_for(process.wait(), 15) == 0
+
+
+def test_parse_args_record_workers():
+    assert parse_args(["8899", "--record", "store"]).record == "store"
+    with pytest.raises(SystemExit):
+        parse_args(["8899", "--record", "store", "--workers", "2"])
+    with pytest.raises(SystemExit):
+        parse_args(["8899", "--record", "store", "--replay", "store"])
+
+
+def test_parse_args_timeouts():
+    args = parse_args(["8899"])
+    assert (args.timeout, args.connect_timeout, args.read_timeout) == (60, 10, None)
+    args = parse_args(["8899", "--timeout", "5", "--retries", "0"])
+    assert args.timeout == 5
+    assert args.retries == 0
+
+
+def test_parse_args_server():
+    args = parse_args(["8899"])
+    assert (args.backlog, args.keepalive_timeout, args.access_log) == (1024, 75, False)
+    args = parse_args(
+        ["8899", "--backlog", "4096", "--keepalive-timeout", "5", "--access-log"]
+    )
+    assert (args.backlog, args.keepalive_timeout, args.access_log) == (4096, 5, True)
+
+
+def test_parse_args_websites():
+    args = parse_args(["8899", "--embedded-websites"])
+    assert args.embedded_websites
+    assert args.website == []
+    args = parse_args(["8899", "--website", "shop.test=my_project.app:make_app"])
+    assert args.website == ["shop.test=my_project.app:make_app"]
+    with pytest.raises(SystemExit):
+        parse_args(["8899", "--website", "my_project.app:make_app"])
+
+
+def test_parse_args_compression():
+    args = parse_args(["8899"])
+    assert not args.compression
+    assert args.compression_levels == {}
+    args = parse_args(
+        [
+            "8899",
+            "--compression",
+            "--compression-level",
+            "gzip=1",
+            "--compression-level",
+            "zstd=-5",
+        ]
+    )
+    assert args.compression
+    assert args.compression_levels == {"gzip": 1, "zstd": -5}
+    with pytest.raises(SystemExit):
+        parse_args(["8899", "--compression-level", "foo=1"])
+    with pytest.raises(SystemExit):
+        parse_args(["8899", "--compression-level", "gzip"])
+
+
+def test_parse_args_shared_cache():
+    args = parse_args(["8899"])
+    assert not args.shared_cache
+    assert args.shared_cache_path.endswith("fake-zyte-api-8899.sqlite3")
+    args = parse_args(
+        [
+            "8899",
+            "--shared-cache",
+            "--shared-cache-size",
+            "16",
+            "--shared-cache-path",
+            "cache.sqlite3",
+        ]
+    )
+    assert args.shared_cache
+    assert args.shared_cache_size == 16
+    assert args.shared_cache_path == "cache.sqlite3"
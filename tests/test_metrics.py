@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from fake_zyte_api.cache import LRUCache
+from fake_zyte_api.metrics import Histogram, Metrics, timed
+
+
+def test_histogram():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.sum == 2.65
+
+
+def test_render():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe("fetch", 0.5)
+    metrics.responses[200] += 2
+    metrics.items["product"] += 1
+    lru: LRUCache[str, bytes] = LRUCache(max_size=10)
+    lru.get("a")
+    metrics.caches["response"] = lru
+    lines = metrics.render().splitlines()
+    assert "# TYPE fake_zyte_api_stage_duration_seconds histogram" in lines
+    assert (
+        'fake_zyte_api_stage_duration_seconds_bucket{stage="fetch",le="0.1"} 0' in lines
+    )
+    assert (
+        'fake_zyte_api_stage_duration_seconds_bucket{stage="fetch",le="1.0"} 1' in lines
+    )
+    assert (
+        'fake_zyte_api_stage_duration_seconds_bucket{stage="fetch",le="+Inf"} 1'
+        in lines
+    )
+    assert 'fake_zyte_api_stage_duration_seconds_count{stage="fetch"} 1' in lines
+    assert 'fake_zyte_api_responses_total{status="200"} 2' in lines
+    assert 'fake_zyte_api_items_total{type="product"} 1' in lines
+    assert 'fake_zyte_api_cache_misses_total{cache="response"} 1' in lines
+    assert "fake_zyte_api_requests_in_flight 0" in lines
+
+
+def test_timed():
+    metrics = Metrics()
+    with timed(metrics, "base64"):
+        pass
+    assert metrics.stage_durations["base64"].count == 1
+    with timed(None, "base64"):
+        pass
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import marshal
+from time import perf_counter
+
+import pytest
+
+from fake_zyte_api.main import make_app
+from fake_zyte_api.profiling import Profiler, ProfilerBusy
+
+
+def busy_function() -> list[str]:
+    return [str(i) for i in range(10_000)]
+
+
+async def call_busy_function(profiler: Profiler, times: int) -> list[list[str]]:
+    results = []
+    for _ in range(times):
+        await asyncio.sleep(0.01)
+        results.append(busy_function())
+        profiler.request_done()
+    return results
+
+
+async def test_cprofile():
+    profiler = Profiler()
+    task = asyncio.create_task(call_busy_function(profiler, 3))
+    output = await profiler.cprofile(5, requests=2, sort="tottime")
+    await task
+    assert b"function calls" in output
+    assert b"busy_function" in output
+
+
+async def test_cprofile_raw():
+    profiler = Profiler()
+    task = asyncio.create_task(call_busy_function(profiler, 1))
+    stats = marshal.loads(await profiler.cprofile(5, requests=1, raw=True))  # noqa: S302
+    await task
+    assert any(function == "busy_function" for _, _, function in stats)
+
+
+async def spin(seconds: float) -> None:
+    await asyncio.sleep(0.01)
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        busy_function()
+
+
+async def test_sample():
+    profiler = Profiler()
+    task = asyncio.create_task(spin(0.05))
+    output = await profiler.sample(0.1, interval=0.001)
+    await task
+    stacks = {}
+    for line in output.decode().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        stacks[stack] = int(count)
+    assert all(count > 0 for count in stacks.values())
+    assert any("busy_function" in stack for stack in stacks)
+
+
+async def test_tracemalloc():
+    profiler = Profiler()
+    task = asyncio.create_task(call_busy_function(profiler, 2))
+    output = await profiler.tracemalloc(5, requests=2, key_type="traceback")
+    results = await task
+    assert len(results) == 2
+    assert b"test_profiling.py" in output
+
+
+async def test_busy():
+    profiler = Profiler()
+    task = asyncio.create_task(profiler.cprofile(0.05))
+    await asyncio.sleep(0)
+    with pytest.raises(ProfilerBusy):
+        await profiler.sample(0.05)
+    await task
+    await profiler.sample(0.01)
+
+
+async def test_invalid():
+    profiler = Profiler()
+    with pytest.raises(ValueError, match="Unknown sort key"):
+        await profiler.cprofile(1, sort="foo")
+    with pytest.raises(ValueError, match="Unknown key type"):
+        await profiler.tracemalloc(1, key_type="foo")
+
+
+async def test_endpoint(aiohttp_client, jobs_website):
+    client = await aiohttp_client(make_app(profiler=Profiler()))
+    url = str(jobs_website.make_url("/jobs/4"))
+    profile_request = asyncio.create_task(
+        client.get("/debug/profile", params={"seconds": "5", "requests": "1"})
+    )
+    await asyncio.sleep(0.01)
+    response = await client.post(
+        "/extract", json={"url": url, "httpResponseBody": True}
+    )
+    assert response.status == 200
+    response = await profile_request
+    assert response.status == 200
+    assert "function calls" in await response.text()
+
+    for params in (
+        {"mode": "foo"},
+        {"seconds": "0"},
+        {"requests": "foo"},
+        {"sort": "foo", "seconds": "0.01"},
+        {"mode": "tracemalloc", "key_type": "foo", "seconds": "0.01"},
+    ):
+        response = await client.get("/debug/profile", params=params)
+        assert response.status == 400, params
+
+    response = await client.get(
+        "/debug/profile", params={"mode": "sample", "seconds": "0.01"}
+    )
+    assert response.status == 200
+
+
+async def test_endpoint_disabled(api_client):
+    response = await api_client.get("/debug/profile")
+    assert response.status == 404
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+from importlib.metadata import EntryPoint
+from typing import Any
+
+import pytest
+from web_poet import WebPage
+
+from fake_zyte_api import registry as registry_module
+from fake_zyte_api.registry import PageRegistry, load_object, make_default_registry
+
+
+class PageA(WebPage[Any]):
+    pass
+
+
+class PageB(WebPage[Any]):
+    pass
+
+
+def register_pages(registry: PageRegistry) -> None:
+    registry.register("product", PageB)
+
+
+def test_register():
+    registry = PageRegistry()
+    registry.register("product", PageA)
+    registry.register("product", f"{__name__}:PageB", urls=["https://b.example/*"])
+    assert registry.get("product", "https://a.example/1") is PageA
+    assert registry.get("product", "https://b.example/1") is PageB
+    assert registry.get("article", "https://a.example/1") is None
+    url = "https://b.example/1"
+    request_data = {"url": url, "product": True, "article": True}
+    assert registry.get_pages(request_data, url) == {"product": PageB}
+
+
+def test_register_reserved():
+    with pytest.raises(ValueError, match="not an item type"):
+        PageRegistry().register("browserHtml", PageA)
+
+
+def test_default_registry():
+    registry = make_default_registry()
+    assert "jobPosting" in registry
+    assert "browserHtml" not in registry
+
+
+def test_load_object():
+    assert load_object(f"{__name__}:PageA") is PageA
+    with pytest.raises(ValueError, match="module:name"):
+        load_object(__name__)
+
+
+def test_load_config(tmp_path):
+    config = {
+        "pages": [
+            {"item": "product", "page": f"{__name__}:PageA"},
+            {
+                "item": "product",
+                "page": f"{__name__}:PageB",
+                "urls": ["https://b.example/*"],
+            },
+        ]
+    }
+    path = tmp_path / "pages.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+    registry = PageRegistry()
+    registry.load_config(path)
+    assert registry.get("product", "https://a.example/1") is PageA
+    assert registry.get("product", "https://b.example/1") is PageB
+
+    path.write_text(json.dumps({"pages": [{"item": "product"}]}), encoding="utf-8")
+    with pytest.raises(ValueError, match="Invalid page config"):
+        registry.load_config(path)
+
+
+def test_load_entry_points(monkeypatch):
+    entry_point = EntryPoint(
+        name="test",
+        value=f"{__name__}:register_pages",
+        group=registry_module.ENTRY_POINT_GROUP,
+    )
+    monkeypatch.setattr(registry_module, "entry_points", lambda **kwargs: [entry_point])
+    registry = PageRegistry()
+    registry.load_entry_points()
+    assert registry.get("product", "https://a.example") is PageB
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from fake_zyte_api import simulation
+from fake_zyte_api.api import RequestError
+from fake_zyte_api.simulation import Simulation
+
+PROFILE = {
+    "seed": 1,
+    "latency": {
+        "default": {"distribution": "constant", "value": 0.0},
+        "httpResponseBody": {"distribution": "uniform", "min": 0.1, "max": 0.2},
+        "browserHtml": {"distribution": "uniform", "min": 1, "max": 2},
+    },
+    "errors": {"429": 0.2, "520": 0.1},
+}
+
+
+async def outcome(sim: Simulation) -> int:
+    try:
+        await sim.simulate({"url": "https://a.example"})
+    except RequestError as error:
+        return error.status
+    return 200
+
+
+async def outcomes(sim: Simulation, count: int) -> list[int]:
+    return [await outcome(sim) for _ in range(count)]
+
+
+def test_latency():
+    sim = Simulation.from_dict(PROFILE)
+    assert sim.latency({"url": "https://a.example"}) == 0
+    assert 0.1 <= sim.latency({"httpResponseBody": True}) <= 0.2
+    latency = sim.latency({"httpResponseBody": True, "browserHtml": True})
+    assert 1 <= latency <= 2
+
+
+async def test_seed():
+    first = await outcomes(Simulation.from_dict(PROFILE), 100)
+    assert first == await outcomes(Simulation.from_dict(PROFILE), 100)
+    assert first != await outcomes(Simulation.from_dict(PROFILE, seed=2), 100)
+    assert {429, 520, 200} == set(first)
+
+
+async def test_rate_limit(monkeypatch):
+    now = 0.0
+    monkeypatch.setattr(simulation, "monotonic", lambda: now)
+    sim = Simulation(requests_per_second=2, burst=2)
+    await sim.simulate({})
+    await sim.simulate({})
+    with pytest.raises(RequestError) as exc_info:
+        await sim.simulate({})
+    assert exc_info.value.status == 429
+    now = 0.5
+    await sim.simulate({})
+
+
+@pytest.mark.parametrize(
+    "profile",
+    [
+        {"errors": {"404": 0.1}},
+        {"errors": {"429": 0.6, "503": 0.6}},
+        {"latency": {"default": {"distribution": "zipf"}}},
+        {"latency": {"default": {"distribution": "uniform", "min": 1}}},
+    ],
+)
+def test_invalid_profile(profile):
+    with pytest.raises(ValueError, match="Invalid simulation profile"):
+        Simulation.from_dict(profile)
+
+
+def test_from_file(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps(PROFILE), encoding="utf-8")
+    sim = Simulation.from_file(path)
+    assert 1 <= sim.latency({"browserHtml": True}) <= 2
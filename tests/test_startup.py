@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+# Modules that are slow to import and only needed to extract items.
+LAZY_MODULES = ("itemadapter", "web_poet", "zyte_common_items", "zyte_test_websites")
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """Return the self and cumulative import times, in microseconds, of every
+    module imported by importing *module* in a new interpreter."""
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_time, cumulative_time, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_time), int(cumulative_time))
+    return times
+
+
+def test_startup_time():
+    times = import_times("fake_zyte_api.main")
+    imported = {name.split(".")[0] for name in times}
+    assert not imported & set(LAZY_MODULES)
+    own_time = sum(
+        self_time
+        for name, (self_time, _) in times.items()
+        if name.startswith("fake_zyte_api")
+    )
+    assert own_time < 100_000, (
+        f"fake_zyte_api.main: {times['fake_zyte_api.main'][1] / 1000:.1f} ms,"
+        f" of which {own_time / 1000:.1f} ms in fake_zyte_api modules"
+    )
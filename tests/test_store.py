@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import pytest
+
+from fake_zyte_api.api import WebsiteResponse
+from fake_zyte_api.main import make_app
+from fake_zyte_api.store import ResponseStore
+
+
+def make_response(body: bytes) -> WebsiteResponse:
+    return WebsiteResponse(
+        status=200,
+        headers=(("Content-Type", "text/html; charset=utf-8"),),
+        body=body,
+    )
+
+
+def test_put_get(tmp_path):
+    store = ResponseStore(tmp_path)
+    store.put("https://a.example", make_response(b"a"))
+    store.put("https://b.example", make_response(b""))
+    store.put("https://a.example", make_response(b"aa"))
+    assert store.get("https://a.example") == make_response(b"aa")
+    assert store.get("https://b.example") == make_response(b"")
+    assert store.get("https://c.example") is None
+    store.close()
+
+    store = ResponseStore(tmp_path, replay=True)
+    assert len(store) == 2
+    assert store.get("https://a.example") == make_response(b"aa")
+    with pytest.raises(ValueError, match="read-only"):
+        store.put("https://c.example", make_response(b"c"))
+    store.close()
+
+
+async def test_record_replay(aiohttp_client, jobs_website, tmp_path):
+    url = str(jobs_website.make_url("/jobs/4"))
+    request_data = {"url": url, "browserHtml": True}
+
+    store = ResponseStore(tmp_path)
+    api_client = await aiohttp_client(make_app(response_store=store))
+    response = await api_client.post("/extract", json=request_data)
+    recorded_data = await response.json()
+    await api_client.close()
+    store.close()
+    assert url in store
+
+    await jobs_website.close()
+
+    store = ResponseStore(tmp_path, replay=True)
+    api_client = await aiohttp_client(make_app(response_store=store))
+    response = await api_client.post("/extract", json=request_data)
+    assert response.status == 200
+    assert await response.json() == recorded_data
+
+    response = await api_client.post("/extract", json={"url": url + "?page=2"})
+    assert response.status == 521
+    assert response.content_type == "application/problem+json"
+    error_data = await response.json()
+    assert error_data["type"] == "/download/internal-error"
+    assert error_data["status"] == 521
+    store.close()
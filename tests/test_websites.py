@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from base64 import b64decode
+
+import aiohttp
+from aiohttp import web
+
+from fake_zyte_api.main import make_app
+from fake_zyte_api.websites import EmbeddedWebsites
+
+
+async def test_default_websites(aiohttp_client):
+    client = await aiohttp_client(make_app(websites=EmbeddedWebsites()))
+    for url in (
+        "http://jobs.test/jobs/4",
+        "http://ecommerce.test/category/1",
+        "http://articles.test/articles/1",
+    ):
+        response = await client.post(
+            "/extract", json={"url": url, "httpResponseBody": True}
+        )
+        assert response.status == 200
+        response_data = await response.json()
+        assert response_data["statusCode"] == 200
+        assert b64decode(response_data["httpResponseBody"])
+
+
+async def test_extraction(aiohttp_client):
+    client = await aiohttp_client(make_app(websites=EmbeddedWebsites()))
+    response = await client.post(
+        "/extract",
+        json={"url": "http://jobs.test/jobs/4", "jobPostingNavigation": True},
+    )
+    assert response.status == 200
+    response_data = await response.json()
+    assert "jobPostingNavigation" in response_data
+
+
+async def test_other_hosts(aiohttp_client, jobs_website):
+    client = await aiohttp_client(make_app(websites=EmbeddedWebsites({})))
+    url = str(jobs_website.make_url("/jobs/4"))
+    response = await client.post("/extract", json={"url": url, "browserHtml": True})
+    assert response.status == 200
+    response_data = await response.json()
+    assert "109 jobs in Energy" in response_data["browserHtml"]
+
+
+async def test_connector():
+    body = b"x" * (4 * 1024 * 1024)
+
+    async def big(request: web.Request) -> web.Response:
+        return web.Response(body=body)
+
+    async def close(request: web.Request) -> web.Response:
+        return web.Response(text="bye", headers={"Connection": "close"})
+
+    app = web.Application()
+    app.router.add_get("/big", big)
+    app.router.add_get("/close", close)
+    websites = EmbeddedWebsites({"example.test": app})
+    await websites.start()
+    try:
+        async with aiohttp.ClientSession(connector=websites.connector()) as session:
+            for _ in range(2):
+                async with session.get("http://example.test/big") as response:
+                    assert await response.read() == body
+                async with session.get("http://example.test/close") as response:
+                    assert await response.text() == "bye"
+            async with session.get("http://example.test/missing") as response:
+                assert response.status == 404
+    finally:
+        await websites.close()